@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmarks import import_time, replay, suite
+
+
+_BUDGETS_FILE_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+_DEFAULT_THRESHOLD = 0.2
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the benchmark suite against a replayed ESV API.")
+    parser.add_argument("--baseline", help="a previous --output file to compare against")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this value")
+    parser.add_argument("--output", help="write the machine-readable results to this file (default: stdout)")
+    parser.add_argument("--record", action="store_true", help="proxy unrecorded requests to the real ESV API and record the responses")
+    parser.add_argument("--threshold", type=float, default=_DEFAULT_THRESHOLD,
+                        help=f"the relative slowdown of the median vs the baseline that counts as a regression (default: {_DEFAULT_THRESHOLD})")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    with open(_BUDGETS_FILE_PATH) as f:
+        budgets = json.load(f)
+    failures = []
+    import_seconds = import_time.measure()
+    if import_seconds > budgets["import bible"]:
+        failures.append(f"import bible took {import_seconds:.4f}s which exceeds the budget of {budgets['import bible']}s")
+    eagerly_imported = import_time.eagerly_imported()
+    if eagerly_imported:
+        failures.append(f"import bible eagerly imported {', '.join(eagerly_imported)}")
+    if not args.record:
+        os.environ.setdefault("ESV_API_TOKEN", "replay")
+    with replay.serve(record=args.record) as url:
+        os.environ["ESV_API_URL"] = url
+        results = suite.run(args.filter)
+    results["import bible"] = {"min": import_seconds, "median": import_seconds, "mean": import_seconds, "repeat": 1}
+    for name, result in results.items():
+        print(f"{name:<40} median {result['median'] * 1000:10.3f}ms  min {result['min'] * 1000:10.3f}ms", file=sys.stderr)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        for name, slowdown in suite.compare(results, baseline, args.threshold).items():
+            failures.append(f"{name} regressed by {slowdown:.1%} (threshold {args.threshold:.0%})")
+    output = json.dumps({"timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(), "results": results},
+                        indent=4)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
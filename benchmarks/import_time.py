@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+
+DEFERRED_MODULES = ("fuzzywuzzy", "graphviz", "num2words", "numpy", "pyarrow", "regex", "requests", "vlc")
+
+
+def eagerly_imported(module_name="bible", deferred_modules=DEFERRED_MODULES):
+    code = f"import sys, {module_name}; print(' '.join(m for m in {deferred_modules!r} if m in sys.modules))"
+    return tuple(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split())
+
+
+def measure(module_name="bible", repeat=5):
+    timings = []
+    for _ in range(repeat):  # take the best of several runs as the import time is noisy
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"], capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            _, cumulative_us, imported_module_name = line.rsplit("|", 2)
+            if imported_module_name == f" {module_name}":  # top level imports are indented by a single space
+                timings.append(int(cumulative_us) / 1e6)
+    return min(timings)
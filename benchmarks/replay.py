@@ -0,0 +1,90 @@
+import contextlib
+import hashlib
+import http.server
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+
+
+RECORDINGS_DIRECTORY = os.path.join(os.path.dirname(__file__), "recordings")
+UPSTREAM_URL = "https://api.esv.org/v3/passage/"
+_SILENT_MP3_FRAME = bytes((0xFF, 0xFB, 0x90, 0x00)) + bytes(413)  # MPEG 1 layer III, 128kbps, 44.1kHz
+_SYNTHETIC_SEARCH_BOOK = "Psalms 119"
+_SYNTHETIC_SEARCH_RESULTS = 176
+
+
+def _verse_number(reference):
+    reference = reference.strip()
+    if reference.isdigit():
+        return int(reference[-3:])
+    return int(reference.rsplit(":", 1)[-1]) if ":" in reference else 1
+
+
+def recording_file_path(path, recordings_directory=RECORDINGS_DIRECTORY):
+    return os.path.join(recordings_directory, f"{hashlib.sha256(path.encode()).hexdigest()[:32]}.json")
+
+
+def synthesize(path):
+    split_path = urllib.parse.urlsplit(path)
+    endpoint = split_path.path.strip("/").split("/")[-1]
+    query = urllib.parse.parse_qs(split_path.query)
+    if endpoint == "text":
+        passages = []
+        for reference in query["q"][0].split(","):
+            verse_number = _verse_number(reference)
+            footnotes = f"\n\nFootnotes\n\n(1) {verse_number}:{verse_number} Or synthetic\n\n" if verse_number % 5 == 0 else "\n\n"
+            passages.append(f"[{verse_number}] Synthetic text standing in for {reference.strip()}, recorded offline.(1){footnotes}")
+        return 200, "application/json", json.dumps({"query": query["q"][0], "passages": passages}).encode()
+    if endpoint == "search":
+        page_size = int(query.get("page-size", ["20"])[0])
+        page = int(query.get("page", ["1"])[0])
+        total_pages = -(-_SYNTHETIC_SEARCH_RESULTS // page_size)
+        verse_numbers = range((page - 1) * page_size + 1, min(page * page_size, _SYNTHETIC_SEARCH_RESULTS) + 1)
+        results = [{"reference": f"{_SYNTHETIC_SEARCH_BOOK}:{verse_number}", "content": f"[{verse_number}] Synthetic search result."}
+                   for verse_number in verse_numbers]
+        return 200, "application/json", json.dumps({"page": page, "total_pages": total_pages, "results": results}).encode()
+    if endpoint == "audio":
+        return 200, "audio/mpeg", _SILENT_MP3_FRAME * 40
+    return 404, "application/json", b"{}"
+
+
+class _ReplayHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        file_path = recording_file_path(self.path, self.server.recordings_directory)
+        if os.path.isfile(file_path):
+            with open(file_path) as f:
+                recording = json.load(f)
+            status, content_type, body = recording["status"], recording["content_type"], bytes.fromhex(recording["body"])
+        elif self.server.record:
+            request = urllib.request.Request(UPSTREAM_URL + self.path.lstrip("/"), headers={"Authorization": self.headers["Authorization"]})
+            with urllib.request.urlopen(request) as response:
+                status, content_type, body = response.status, response.headers["Content-Type"], response.read()
+            os.makedirs(self.server.recordings_directory, exist_ok=True)
+            with open(file_path, "w") as f:
+                json.dump({"path": self.path, "status": status, "content_type": content_type, "body": body.hex()}, f)
+        else:
+            status, content_type, body = synthesize(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve(recordings_directory=RECORDINGS_DIRECTORY, record=False):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ReplayHandler)
+    server.recordings_directory = recordings_directory
+    server.record = record
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,167 @@
+import functools
+import os
+import statistics
+import tempfile
+import time
+
+from bible import enums, snapshot, utils
+from bible.translations.esv import api as esv_api
+
+
+BENCHMARKS = {}
+README_BOOK_REFERENCES = ("7:13-9:21", "7:13-21", "7-21", "-3:", "-")  # <Genesis>
+README_CHAPTER_REFERENCES = ("9-16", "13", "-")  # <John 3>
+README_INT_REFERENCES = ("01001001-02003006", "37002003-", "4002009", " -2003019")
+README_REFERENCES = ("-", "Matth-", "John 2:3-John", "John 2:3 - John 2", "John 2-6", "John 2:3-6", "- Exo")
+
+
+def benchmark(name, repeat=5, setup=None):
+    def decorator(function):
+        BENCHMARKS[name] = (function, setup, repeat)
+        return function
+    return decorator
+
+
+def load_esv():
+    return utils.load_translation(translation_cls=esv_api.Translation, book_cls=esv_api.Book, chapter_cls=esv_api.Chapter, verse_cls=esv_api.Verse,
+                                  passage_cls=esv_api.Passage)
+
+
+@functools.lru_cache(maxsize=None)
+def shared_esv():  # for benchmarks that neither mutate nor cache anything on the translation
+    return load_esv()
+
+
+@benchmark("load_translation", setup=utils.clear_data_cache)  # parses the data files every time, as a new process does
+def _load_translation(_):
+    load_esv()
+
+
+@benchmark("load_translation (data files already parsed)")
+def _load_translation_parsed(_):
+    load_esv()
+
+
+@functools.lru_cache(maxsize=None)
+def snapshot_file_path():
+    file_path = os.path.join(tempfile.mkdtemp(), "esv.snapshot")
+    snapshot.write(file_path, shared_esv())
+    return file_path
+
+
+@benchmark("snapshot.attach()", setup=snapshot_file_path)
+def _attach_snapshot(file_path):
+    snapshot.attach(file_path)
+
+
+@benchmark("reference parsing (README examples)", repeat=20, setup=shared_esv)
+def _reference_parsing(translation):
+    for reference in README_REFERENCES:
+        translation.passage(reference)
+    for int_reference in README_INT_REFERENCES:
+        translation.passage(None, int_reference)
+    for reference in README_BOOK_REFERENCES:
+        translation["Genesis"].passage(reference)
+    for reference in README_CHAPTER_REFERENCES:
+        translation["John"][3].passage(reference)
+
+
+@benchmark("Book.verses()", repeat=20, setup=shared_esv)
+def _book_verses(translation):
+    for _ in translation["Psalms"].verses():
+        pass
+
+
+@benchmark("Passage.verses() (whole bible)", setup=shared_esv)
+def _passage_verses(translation):
+    for _ in translation.passage("-").verses():
+        pass
+
+
+@benchmark("characters() (translation)", repeat=20, setup=shared_esv)
+def _translation_characters(translation):
+    len(translation.characters())
+
+
+@benchmark("characters() (book)", setup=shared_esv)
+def _book_characters(translation):
+    len(translation["Genesis"].characters())
+
+
+@benchmark("characters() (chapter)", setup=shared_esv)
+def _chapter_characters(translation):
+    len(translation["Genesis"][10].characters())
+
+
+@benchmark("characters() (verse)", setup=shared_esv)
+def _verse_characters(translation):
+    len(translation["Genesis"][10][2].characters())
+
+
+@benchmark("characters() (passage)", setup=shared_esv)
+def _passage_characters(translation):
+    len(translation.passage("Genesis 4-11").characters())
+
+
+@benchmark("Filterable chains", setup=shared_esv)
+def _filterable_chains(translation):
+    characters = translation.characters()
+    len(characters.male.true().name.like("Ham", "Shem"))
+    len((characters.gender == enums.CharacterGender.FEMALE.value).spouses.contains(characters["Noah"]))
+    len(characters.combine(characters.name.any("Adam", "Eve"), characters.father.true()))
+    len(characters.lineage(characters["Adam"], characters["Canaan"]))
+    tuple(characters.select("name", "gender", "father"))
+
+
+@benchmark("relation()", setup=shared_esv)
+def _relation(translation):
+    characters = [character for character in translation.characters() if character.parents][:40]
+    for character in characters:
+        for other in characters:
+            character.relation(other)
+
+
+@benchmark("text() (passage, replayed)", setup=load_esv)
+def _passage_text(translation):
+    translation.passage("Genesis 1 - Genesis 50").text()
+
+
+@benchmark("iter_text() first verse (passage, replayed)", setup=load_esv)
+def _passage_iter_text(translation):
+    next(translation.passage("Genesis 1 - Genesis 50").iter_text())
+
+
+@benchmark("text() (verses, replayed)", setup=load_esv)
+def _verse_text(translation):
+    for verse in translation["John"][3]:
+        verse.text()
+
+
+@benchmark("search() (replayed)", setup=load_esv)
+def _search(translation):
+    for _ in translation.search("grace"):
+        pass
+
+
+def compare(results, baseline, threshold):
+    regressions = {}
+    for name, result in results.items():
+        baseline_result = baseline.get(name)
+        if baseline_result is not None and result["median"] > baseline_result["median"] * (1 + threshold):
+            regressions[name] = result["median"] / baseline_result["median"] - 1
+    return regressions
+
+
+def run(name_filter=None):
+    results = {}
+    for name, (function, setup, repeat) in BENCHMARKS.items():
+        if name_filter is not None and name_filter.lower() not in name.lower():
+            continue
+        timings = []
+        for _ in range(repeat):
+            argument = setup() if setup is not None else None
+            start = time.perf_counter()
+            function(argument)
+            timings.append(time.perf_counter() - start)
+        results[name] = {"min": min(timings), "median": statistics.median(timings), "mean": statistics.mean(timings), "repeat": repeat}
+    return results
@@ -1,12 +1,19 @@
 import dotenv
 
-from bible import utils
+from bible import registry, utils
 from bible.translations.esv import api as esv_api
 
 
 dotenv.load_dotenv()
 
 
-def esv():
+def _load_esv():
     return utils.load_translation(translation_cls=esv_api.Translation, book_cls=esv_api.Book, chapter_cls=esv_api.Chapter, verse_cls=esv_api.Verse,
                                   passage_cls=esv_api.Passage)
+
+
+registry.register("esv", _load_esv)
+
+
+def esv():
+    return registry.get("esv")
@@ -1,10 +1,9 @@
+import array
 import collections
 import dataclasses
-import graphviz
-import regex as re  # we need variable-width lookbehind assertions
 import typing
 
-from bible import enums, utils
+from bible import enums, genealogy, mentions, metrics, utils
 
 
 _range = "(?P<range>-)?"
@@ -35,6 +34,7 @@ class _Characters(utils.Filterable):
                             self.number == descendant.number)
 
     def tree(self, directory=f".tmp/{__name__}", view=True):  # WIP
+        graphviz = utils.import_optional("graphviz", "tree")
         dot = graphviz.Digraph(comment="Genealogy")
         relationships = []
         for character in self:
@@ -47,14 +47,16 @@ class _Characters(utils.Filterable):
 
 
 class Verse:
-    _NAME_REGEX = re.compile(r"^(?P<verse_number>\d+)$")
+    _NAME_REGEX = utils.LazyRegex(r"^(?P<verse_number>\d+)$")
 
     def __init__(self, number, chapter):
         self._number = number
         self._chapter = chapter
         self._book = self._chapter.book
         self._translation = self._book.translation
+        self._ordinal = None
         chapter._register_verse(self)
+        self._translation._register_verse(self)
 
     def __repr__(self):
         return (f"{utils.name(type(self))}(number={self._number}, chapter={self._chapter.number}, book={self._book.name}, "
@@ -63,14 +65,9 @@ class Verse:
     def __str__(self):
         return utils.reference(self._book.name, self._chapter.number, self._number)
 
+    @metrics.timed("characters.lookup", scope="verse")
     def _characters(self):
-        int_reference = int(self.int_reference)
-        for character in self._translation.characters().all():
-            for passage in character.passages:
-                passage_int_reference_start, passage_int_reference_end = passage.int_reference.split(" - ")
-                if int(passage_int_reference_start) <= int_reference <= int(passage_int_reference_end):
-                    yield character
-                    break
+        yield from self._translation._characters_overlapping((self._ordinal, self._ordinal))
 
     @property
     def book(self):
@@ -96,6 +93,10 @@ class Verse:
     def int_reference(self):
         return utils.int_reference(self._book.number, self._chapter.number, self._number)
 
+    @property
+    def ordinal(self):
+        return self._ordinal
+
     @property
     def translation(self):
         return self._translation
@@ -106,6 +107,11 @@ class Verse:
     def characters(self, field=None):
         return _Characters(self._characters(), Character, field)
 
+    def mentions(self, field=None):  # the characters named in the text, once Translation.index_mentions() has been run
+        characters = self._translation._characters
+        character_numbers = self._translation._mention_index().character_numbers(self._ordinal)
+        return _Characters((characters[number] for number in character_numbers), self._translation.Character, field)
+
     def next(self, overspill=True):
         if self.is_last:
             if overspill:
@@ -129,8 +135,9 @@ class Verse:
 
 
 class Chapter:
-    _NAME_REGEX = re.compile(r"^(?P<chapter_number>\d+)$")
-    _PASSAGE_REGEX = re.compile(f"^{utils.fetch_pattern(Verse)}?{_range}{utils.fetch_pattern(Verse, '_end')}?$", flags=re.ASCII | re.IGNORECASE)
+    _NAME_REGEX = utils.LazyRegex(r"^(?P<chapter_number>\d+)$")
+    _PASSAGE_REGEX = utils.LazyRegex(f"^{utils.fetch_pattern(Verse)}?{_range}{utils.fetch_pattern(Verse, '_end')}?$",
+                                     flags=("ASCII", "IGNORECASE"))
 
     def __init__(self, number, book):
         self._number = number
@@ -160,19 +167,12 @@ class Chapter:
     def __str__(self):
         return utils.reference(self._book.name, self._number)
 
+    @metrics.timed("characters.lookup", scope="chapter")
     def _characters(self):
-        int_reference_0 = int(utils.int_reference(self._book.number, self._number, 0))
-        for character in self._translation.characters().all():
-            for passage in character.passages:
-                if (
-                    int(utils.int_reference(passage.book_start.number, passage.chapter_start.number, 0)) <=
-                    int_reference_0 <=
-                    int(utils.int_reference(passage.book_end.number, passage.chapter_end.number, 0))
-                   ):
-                    yield character
-                    break
+        yield from self._translation._characters_overlapping((self.first().ordinal, self.last().ordinal))
 
     def _register_verse(self, verse):
+        self._translation._check_not_frozen()
         if verse.number in self._verses:
             raise utils.BibleSetupError(f"a verse is already registered in this chapter ({self}) with the number, {verse.number}")
         self._verses[verse.number] = verse
@@ -222,6 +222,7 @@ class Chapter:
             return None
         return self._book[self._number + 1]
 
+    @metrics.timed("reference.parse", scope="chapter")
     def passage(self, reference="-"):
         match = self._PASSAGE_REGEX.match(reference)
         if match is None:
@@ -253,10 +254,10 @@ class Chapter:
 
 
 class Book:
-    _NAME_REGEX = re.compile(r"^(?P<book_name>(?:\d{1})?[A-Z]+)$", flags=re.ASCII | re.IGNORECASE)
-    _PASSAGE_REGEX = re.compile(fr"^{utils.fetch_pattern(Chapter)}?:?{utils.fetch_pattern(Verse)}?{_range}"
-                                fr"(?P<chapter_number_end>(?<!:.*-)\d+|(?=\d*:)\d+)?:?{utils.fetch_pattern(Verse, '_end')}?$",
-                                flags=re.ASCII | re.IGNORECASE)
+    _NAME_REGEX = utils.LazyRegex(r"^(?P<book_name>(?:\d{1})?[A-Z]+)$", flags=("ASCII", "IGNORECASE"))
+    _PASSAGE_REGEX = utils.LazyRegex(fr"^{utils.fetch_pattern(Chapter)}?:?{utils.fetch_pattern(Verse)}?{_range}"
+                                     fr"(?P<chapter_number_end>(?<!:.*-)\d+|(?=\d*:)\d+)?:?{utils.fetch_pattern(Verse, '_end')}?$",
+                                     flags=("ASCII", "IGNORECASE"))
 
     def __init__(self, number, name, translation, alt_names=(), author=None, categories=(), language=None):
         self._number = number
@@ -295,19 +296,12 @@ class Book:
     def __str__(self):
         return utils.reference(self._name)
 
+    @metrics.timed("characters.lookup", scope="book")
     def _characters(self):
-        int_reference_0 = int(utils.int_reference(self._number, 0, 0))
-        for character in self._translation.characters().all():
-            for passage in character.passages:
-                if (
-                    int(utils.int_reference(passage.book_start.number, 0, 0)) <=
-                    int_reference_0 <=
-                    int(utils.int_reference(passage.book_end.number, 0, 0))
-                   ):
-                    yield character
-                    break
+        yield from self._translation._characters_overlapping((self.first().first().ordinal, self.last().last().ordinal))
 
     def _register_chapter(self, chapter):
+        self._translation._check_not_frozen()
         if chapter.number in self._chapters:
             raise utils.BibleSetupError(f"a chapter is already registered in this book ({self}) with the number, {chapter.number}")
         self._chapters[chapter.number] = chapter
@@ -380,6 +374,7 @@ class Book:
             return None
         return self._translation[self._number + 1]
 
+    @metrics.timed("reference.parse", scope="book")
     def passage(self, reference="-"):
         match = self._PASSAGE_REGEX.match(reference)
         if match is None:
@@ -417,11 +412,12 @@ class Book:
 
 
 class Translation:
-    _INT_PASSAGE_REGEX = re.compile(fr"^(?:(?P<book_number_start>\d{{1,2}})(?P<chapter_number_start>\d{{3}})(?P<verse_number_start>\d{{3}}))?{_range}"
-                                    r"(?:(?P<book_number_end>\d{1,2})(?P<chapter_number_end>\d{3})(?P<verse_number_end>\d{3}))?$")
-    _PASSAGE_REGEX = re.compile(fr"^{utils.fetch_pattern(Book)}?{utils.fetch_pattern(Chapter)}?:?{utils.fetch_pattern(Verse)}?{_range}"
-                                fr"{utils.fetch_pattern(Book, '_end')}?(?P<chapter_number_end>(?<!:.*-)\d+|(?=\d*:)\d+)?:?"
-                                fr"{utils.fetch_pattern(Verse, '_end')}?$", flags=re.ASCII | re.IGNORECASE)
+    _INT_PASSAGE_REGEX = utils.LazyRegex(fr"^(?:(?P<book_number_start>\d{{1,2}})(?P<chapter_number_start>\d{{3}})"
+                                         fr"(?P<verse_number_start>\d{{3}}))?{_range}"
+                                         r"(?:(?P<book_number_end>\d{1,2})(?P<chapter_number_end>\d{3})(?P<verse_number_end>\d{3}))?$")
+    _PASSAGE_REGEX = utils.LazyRegex(fr"^{utils.fetch_pattern(Book)}?{utils.fetch_pattern(Chapter)}?:?{utils.fetch_pattern(Verse)}?{_range}"
+                                     fr"{utils.fetch_pattern(Book, '_end')}?(?P<chapter_number_end>(?<!:.*-)\d+|(?=\d*:)\d+)?:?"
+                                     fr"{utils.fetch_pattern(Verse, '_end')}?$", flags=("ASCII", "IGNORECASE"))
 
     def __init__(self, name, passage_cls, character_cls):
         self._name = name
@@ -430,6 +426,12 @@ class Translation:
         self._books = utils.FuzzyDict()
         self._categories = utils.FuzzyDict()
         self._characters = {}
+        self._verses = []
+        self._character_index = None
+        self._layout = None
+        self._genealogy = None
+        self._mentions = None
+        self._frozen = False
 
     def __contains__(self, item):
         return item in set(self._books.values())
@@ -449,7 +451,34 @@ class Translation:
     def __repr__(self):
         return f"{utils.name(type(self))}(name={self._name})"
 
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise utils.BibleSetupError(f"the translation ({self}) is frozen; nothing more can be registered")
+
+    def _build_character_index(self):
+        return utils.IntervalIndex.from_intervals((passage.verse_start.ordinal, passage.verse_end.ordinal, character.number)
+                                                  for character in self._characters.values() for passage in character.passages)
+
+    def _characters_overlapping(self, *ordinal_ranges):
+        character_index = self._character_index if self._character_index is not None else self._build_character_index()
+        numbers = set().union(*(character_index.overlapping(start, end) for start, end in ordinal_ranges))
+        for character in self._characters.values():
+            if character.number in numbers:
+                yield character
+
+    def _freeze(self, character_index=None):
+        self._character_index = character_index if character_index is not None else self._build_character_index()
+        self._layout = utils.Layout.intern(array.array("I", (verse.book.number * 1000000 + verse.chapter.number * 1000 + verse.number
+                                                             for verse in self._verses)))
+        self._frozen = True
+
+    def _mention_index(self):
+        if self._mentions is None:
+            raise utils.BibleSetupError(f"mentions have not been indexed for this translation ({self}); call index_mentions() first")
+        return self._mentions
+
     def _register_book(self, book):
+        self._check_not_frozen()
         book_ids = (book.number, book.id, *book.alt_ids)
         existing_book_ids = [book_id for book_id in book_ids if book_id in self._books]
         if existing_book_ids:
@@ -460,10 +489,16 @@ class Translation:
             self._categories[category] = existing_category + (book, )
 
     def _register_character(self, character):
+        self._check_not_frozen()
         if character.number in self._characters:
             raise utils.BibleSetupError(f"a character is already registered in this translation ({self}) with the number, {character.number}")
         self._characters[character.number] = character
 
+    def _register_verse(self, verse):
+        self._check_not_frozen()
+        verse._ordinal = len(self._verses)
+        self._verses.append(verse)
+
     @property
     def categories(self):
         return self._categories
@@ -472,6 +507,14 @@ class Translation:
     def Character(self):
         return self._character_cls
 
+    @property
+    def genealogy(self):  # compiled on first use, as characters can only be related once they have all been registered
+        if self._genealogy is None:
+            if not self._frozen:
+                raise utils.BibleSetupError(f"the genealogy of this translation ({self}) is only available once every character is registered")
+            self._genealogy = genealogy.Genealogy.build(self)
+        return self._genealogy
+
     @property
     def name(self):
         return self._name
@@ -489,9 +532,14 @@ class Translation:
     def first(self):
         return self[1]
 
+    def index_mentions(self, texts, workers=None):  # texts is a corpus (or its file path) or a mapping of verse ordinal to text
+        self._mentions = mentions.build(self, texts, workers)
+        return self._mentions
+
     def last(self):
         return self[len(self)]
 
+    @metrics.timed("reference.parse", scope="translation")
     def passage(self, reference=None, int_reference=None):
         if reference is not None:
             if int_reference is not None:
@@ -553,18 +601,11 @@ class Passage:
         return (f"{utils.reference(self._book_start.name, self._chapter_start.number, self._verse_start.number)} - "
                 f"{utils.reference(self._book_end.name, self._chapter_end.number, self._verse_end.number)}")
 
-    def _characters(self):
-        int_reference_start, int_reference_end = self.int_reference.split(" - ")
-        for character in self._translation.characters().all():
-            for passage in character.passages:
-                passage_int_reference_start, passage_int_reference_end = passage.int_reference.split(" - ")
-                if (
-                    int(passage_int_reference_start) <= int(int_reference_start) <= int(passage_int_reference_end)
-                    or
-                    int(passage_int_reference_start) <= int(int_reference_end) <= int(passage_int_reference_end)
-                ):
-                    yield character
-                    break
+    @metrics.timed("characters.lookup", scope="passage")
+    def _characters(self):  # characters present at either end of the passage
+        start = self._verse_start.ordinal
+        end = self._verse_end.ordinal
+        yield from self._translation._characters_overlapping((start, start), (end, end))
 
     @property
     def book_end(self):
@@ -647,11 +688,8 @@ class Character(utils.FamilyTreeMixin):
     nationality: typing.Union[utils.Unknown, str] = utils.UNKNOWN
     place_of_death: typing.Union[utils.Unknown, str] = utils.UNKNOWN
     primary_occupation: typing.Union[utils.Unknown, str] = utils.UNKNOWN
-    _children: list = dataclasses.field(default_factory=list, hash=False)
 
     def __post_init__(self):
-        for parent in self.parents:
-            parent._children.append(self)
         self.translation._register_character(self)
 
     def __repr__(self):
@@ -671,7 +709,7 @@ class Character(utils.FamilyTreeMixin):
 
     @property
     def children(self):
-        return tuple(self._children)
+        return self.translation.genealogy.children(self)
 
     @property
     def daughters(self):
@@ -707,11 +745,11 @@ class Character(utils.FamilyTreeMixin):
 
     @property
     def parents(self):
-        return tuple(filter(None, (self.mother, self.father)))
+        return self.translation.genealogy.parents(self)
 
     @property
     def siblings(self):
-        return tuple(set(child for parent in self.parents for child in parent.children if child is not self))
+        return self.translation.genealogy.siblings(self)
 
     @property
     def sisters(self):
@@ -723,8 +761,11 @@ class Character(utils.FamilyTreeMixin):
 
     @property
     def spouses(self):
-        return tuple(self.translation._characters[spouse] for spouse in self._spouses)
+        return self.translation.genealogy.spouses(self)
 
     @property
     def wives(self):
         return tuple(spouse for spouse in self.spouses if spouse.gender == enums.CharacterGender.FEMALE.value)
+
+    def mentions(self):  # the verses that name the character, once Translation.index_mentions() has been run
+        return tuple(self.translation._verses[ordinal] for ordinal in self.translation._mention_index().ordinals(self.number))
@@ -0,0 +1,118 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import re
+import sys
+
+import bible
+from bible import snapshot, utils
+from bible.translations.esv import api as esv_api
+
+
+_DEFAULT_WORKERS = 4
+_INT_REFERENCE_REGEX = re.compile(r"^[\d\s-]+$")
+_MAX_VERSES_PER_BATCH = esv_api.ESVAPIMixin._MAX_VERSES_PER_TEXT_QUERY
+
+_Item = collections.namedtuple("Item", ("line_number", "line", "passage", "verses", "error"))
+
+
+def _batches(translation, lines):  # groups consecutive lines into batches that fit within one ESV text query
+    batch = []
+    batch_verses = 0
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            passage = translation.passage(int_reference=line) if _INT_REFERENCE_REGEX.match(line) else translation.passage(line)
+            verses = list(passage.verses())
+        except (utils.BibleReferenceError, KeyError, ValueError) as e:
+            batch.append(_Item(line_number, line, None, (), f"invalid reference: {e}"))
+            continue
+        if batch and batch_verses + len(verses) > _MAX_VERSES_PER_BATCH:
+            yield batch
+            batch = []
+            batch_verses = 0
+        batch.append(_Item(line_number, line, passage, verses, None))
+        batch_verses += len(verses)
+    if batch:
+        yield batch
+
+
+def _error(item, error):
+    return {"line": item.line_number, "input": item.line, "error": error}
+
+
+def _resolve(translation, batch):
+    verses = list(dict.fromkeys(verse for item in batch for verse in item.verses))
+    try:
+        texts = dict(zip(verses, translation.texts(verses)))
+    except (esv_api.ESVError, OSError) as e:
+        return [_error(item, item.error or f"the text could not be fetched: {e}") for item in batch]
+    records = []
+    for item in batch:
+        if item.error is not None:
+            records.append(_error(item, item.error))
+            continue
+        item_texts = [texts[verse] for verse in item.verses]
+        titles = [text.title for text in item_texts if text.title is not None]
+        records.append({
+            "reference": str(item.passage),
+            "int_reference": item.passage.int_reference,
+            "body": " ".join(text.body for text in item_texts),
+            "title": " ".join(titles) if titles else None,
+            "footnotes": {verse.int_reference: text.footnotes for verse, text in zip(item.verses, item_texts) if text.footnotes}
+        })
+    return records
+
+
+def run(translation, lines, output=None, workers=_DEFAULT_WORKERS):  # returns the number of lines that failed
+    output = output or sys.stdout
+    errors = 0
+    pending = collections.deque()
+
+    def write(records):
+        nonlocal errors
+        for record in records:
+            errors += "error" in record
+            output.write(json.dumps(record) + "\n")
+        output.flush()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(translation, lines):
+            pending.append(executor.submit(_resolve, translation, batch))
+            while len(pending) > workers:  # bounds memory and keeps the output in input order
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return errors
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bible.batch",
+                                     description="Resolve references (or int_reference ranges), one per line, to JSONL text.")
+    parser.add_argument("input", nargs="?", default="-", help="a file of references (default: stdin)")
+    parser.add_argument("--snapshot", help="attach to this snapshot (see bible.snapshot) rather than loading the translation")
+    parser.add_argument("--text", help="read text from this corpus file (see Translation.dump_text) rather than the ESV API")
+    parser.add_argument("--workers", type=int, default=_DEFAULT_WORKERS,
+                        help=f"the number of queries in flight at once (default: {_DEFAULT_WORKERS})")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    translation = snapshot.attach(args.snapshot) if args.snapshot is not None else bible.esv()
+    if args.text is not None:
+        translation.load_text(args.text)
+    if args.input == "-":
+        errors = run(translation, sys.stdin, workers=args.workers)
+    else:
+        with open(args.input) as f:
+            errors = run(translation, f, workers=args.workers)
+    if errors:
+        print(f"{errors} line(s) could not be resolved", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,585 @@
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+from bible import metrics
+
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only the threads of one process are kept from racing on the index
+    fcntl = None
+
+
+_ACCESS_SAVE_INTERVAL = 30  # seconds; how stale the access times another process sees may be
+
+CacheStatistics = collections.namedtuple("CacheStatistics", ("entries", "bytes", "hits", "misses", "evictions", "hit_rate"))
+
+
+def atomic_write(file_path, content):
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_file_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        os.unlink(temp_file_path)
+        raise
+
+
+def checksum(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class BoundedCache:  # in memory, bounded by entries and/or bytes, evicting the least recently (lru) or least frequently (lfu) used entry
+    _POLICIES = ("lfu", "lru")
+
+    def __init__(self, max_entries=None, max_bytes=None, policy="lru", weak=False, size_of=sys.getsizeof):
+        if policy not in self._POLICIES:
+            raise ValueError(f"{policy} is not one of the supported policies, {', '.join(self._POLICIES)}")
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._size_of = size_of
+        self._items = {}
+        self._sizes = {}
+        self._bytes = 0
+        self._frequencies = {}  # always 0 under lru
+        self._buckets = {}  # use count -> keys, least recently used first
+        self._evicted = weakref.WeakValueDictionary() if weak else None  # evicted values that are still referenced elsewhere
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def _evict(self):
+        while self._items and ((self._max_entries is not None and len(self._items) > self._max_entries) or
+                               (self._max_bytes is not None and self._bytes > self._max_bytes)):
+            key = next(iter(self._buckets[min(self._buckets)]))
+            value = self._remove(key)
+            self._evictions += 1
+            if self._evicted is not None:
+                try:
+                    self._evicted[key] = value
+                except TypeError:  # not weakly referenceable
+                    pass
+
+    def _put(self, key, value):
+        if key in self._items:
+            self._remove(key)
+        self._items[key] = value
+        self._sizes[key] = self._size_of(value)
+        self._bytes += self._sizes[key]
+        self._frequencies[key] = 0
+        self._buckets.setdefault(0, collections.OrderedDict())[key] = None
+
+    def _remove(self, key):
+        frequency = self._frequencies.pop(key)
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+        self._bytes -= self._sizes.pop(key)
+        return self._items.pop(key)
+
+    def _touch(self, key):
+        frequency = self._frequencies[key]
+        if self._policy == "lfu":
+            bucket = self._buckets[frequency]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[frequency]
+            frequency = self._frequencies[key] = frequency + 1
+        bucket = self._buckets.setdefault(frequency, collections.OrderedDict())
+        bucket[key] = None
+        bucket.move_to_end(key)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._frequencies.clear()
+            self._buckets.clear()
+            self._bytes = 0
+            if self._evicted is not None:
+                self._evicted.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None and self._evicted is not None:
+                value = self._evicted.pop(key, None)
+                if value is not None:  # still alive elsewhere, so take it back rather than fetching it again
+                    self._put(key, value)
+            if value is None:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._touch(key)
+            self._evict()
+            return value
+
+    def items(self):  # a snapshot, in eviction order
+        with self._lock:
+            return [(key, self._items[key]) for _, bucket in sorted(self._buckets.items()) for key in bucket]
+
+    def peek(self, key, default=None):  # without counting towards the statistics or the eviction order
+        with self._lock:
+            return self._items.get(key, default)
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+            self._evict()
+        return value
+
+    def statistics(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return CacheStatistics(len(self._items), self._bytes, self._hits, self._misses, self._evictions,
+                                   self._hits / lookups if lookups else 0.0)
+
+
+class FileCache:  # the index is shared with other processes using the directory, so it is merged with the saved copy whenever it is saved
+    _INDEX_FILE_NAME = "index.json"
+    _LOCK_FILE_NAME = "index.lock"
+
+    def __init__(self, directory, max_bytes=None, extension=""):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._extension = extension
+        self._index_file_path = os.path.join(directory, self._INDEX_FILE_NAME)
+        self._lock_file_path = os.path.join(directory, self._LOCK_FILE_NAME)
+        self._index = None
+        self._changes = {}  # entries put (or None for those removed) since the index was last saved
+        self._accesses = {}  # when entries were last read since the index was last saved
+        self._saved = time.monotonic()
+        self._verified = set()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries())
+
+    def _entries(self):
+        if self._index is None:
+            with self._index_lock():
+                self._index = self._read()
+                self._remove_orphans()
+        return self._index
+
+    def _evict(self, keep=None):
+        entries = self._entries()
+        if self._max_bytes is None:
+            return
+        total_bytes = sum(entry["size"] for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if total_bytes <= self._max_bytes:
+                break
+            if key == keep:  # the newest entry is always kept, even if it alone exceeds the budget
+                continue
+            self._remove(key)
+            total_bytes -= entry["size"]
+
+    def _file_name(self, key):
+        return hashlib.sha256(key.encode()).hexdigest() + self._extension
+
+    def _file_path(self, file_name):
+        return os.path.join(self._directory, file_name)
+
+    @contextlib.contextmanager
+    def _index_lock(self):  # excludes other processes from reading, merging and saving the index (and removing files) meanwhile
+        os.makedirs(self._directory, exist_ok=True)
+        with open(self._lock_file_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            yield
+
+    def _read(self):  # the saved index with our unsaved changes applied, less any entries whose files have gone
+        try:
+            with open(self._index_file_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):  # a missing or corrupt index simply means an empty cache
+            index = {}
+        for key, entry in self._changes.items():
+            if entry is None:
+                index.pop(key, None)
+            else:
+                index[key] = entry
+        for key, last_access in self._accesses.items():
+            if key in index:
+                index[key]["last_access"] = max(index[key]["last_access"], last_access)
+        return {key: entry for key, entry in index.items() if os.path.isfile(self._file_path(entry["file_name"]))}
+
+    def _remove(self, key):
+        entry = self._entries().pop(key)
+        self._changes[key] = None
+        self._accesses.pop(key, None)
+        self._verified.discard(key)
+        try:
+            os.remove(self._file_path(entry["file_name"]))
+        except FileNotFoundError:
+            pass
+
+    def _remove_orphans(self):
+        file_names = {entry["file_name"] for entry in self._index.values()}
+        try:
+            directory_file_names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return
+        for file_name in directory_file_names:
+            if file_name.endswith(self._extension) and len(file_name) == 64 + len(self._extension) and file_name not in file_names:
+                os.remove(self._file_path(file_name))
+
+    def _save(self, keep=None):
+        with self._index_lock():
+            self._sync(keep)
+
+    def _sync(self, keep=None):  # the index lock must be held; the byte budget applies to the entries of every process
+        self._index = self._read()
+        self._evict(keep)
+        atomic_write(self._index_file_path, json.dumps(self._index, indent=1).encode())
+        self._changes.clear()
+        self._accesses.clear()
+        self._saved = time.monotonic()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries().values())
+
+    def clear(self):
+        with self._lock, self._index_lock():
+            self._index = self._read()
+            for key in list(self._index):
+                self._remove(key)
+            self._sync()
+
+    def flush(self):  # save the access times of recent hits now rather than with the next batch
+        with self._lock:
+            if self._changes or self._accesses:
+                self._save()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries().get(key)
+            if entry is None and os.path.isfile(self._file_path(self._file_name(key))):  # perhaps put by another process since we read
+                with self._index_lock():
+                    self._index = self._read()
+                entry = self._index.get(key)
+            if entry is None:
+                return None
+            file_path = self._file_path(entry["file_name"])
+            if not os.path.isfile(file_path):  # evicted by another process since we read the index
+                with self._index_lock():
+                    self._index = self._read()
+                self._verified.discard(key)
+                return None
+            if key not in self._verified:
+                try:
+                    with open(file_path, "rb") as f:
+                        content = f.read()
+                except FileNotFoundError:
+                    content = None
+                if content is None or len(content) != entry["size"] or checksum(content) != entry["checksum"]:
+                    self._remove(key)
+                    self._save()
+                    return None
+                self._verified.add(key)
+            entry["last_access"] = self._accesses[key] = time.time()
+            if time.monotonic() - self._saved >= _ACCESS_SAVE_INTERVAL:  # access times only order eviction, so they are saved in batches
+                self._save()
+            return file_path
+
+    def put(self, key, content):
+        with self._lock:
+            self._entries()
+            file_name = self._file_name(key)
+            with self._index_lock():  # held from writing the file, so no other process can remove it as an orphan before it is indexed
+                atomic_write(self._file_path(file_name), content)
+                self._changes[key] = {"file_name": file_name, "size": len(content), "checksum": checksum(content), "last_access": time.time()}
+                self._verified.add(key)
+                self._sync(keep=key)
+            return self._file_path(file_name)
+
+
+class JSONStore:
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._data = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self._file_path) as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._load()[key] = value
+            atomic_write(self._file_path, json.dumps(self._data).encode())
+
+
+class LRUCache:
+    _MISSING = object()
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._items.get(key, self._MISSING)
+            if value is self._MISSING:
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+        return value
+
+
+class MicroBatcher:  # collects the keys submitted within a short delay (or until max_size) and resolves them with one call
+    def __init__(self, function, max_size, delay=0.005, workers=4):
+        self._function = function  # called with a list of keys; returns their results in the same order
+        self._max_size = max_size
+        self._delay = delay
+        self._pending = {}  # key -> future, in submission order
+        self._closed = False
+        self._lock = threading.Lock()
+        self._submitted = threading.Condition(self._lock)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bible-micro-batch")
+        self._thread = threading.Thread(target=self._collect, name="bible-micro-batch-collector", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _collect(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._submitted.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self._delay
+                while len(self._pending) < self._max_size and not self._closed and time.monotonic() < deadline:
+                    self._submitted.wait(deadline - time.monotonic())
+                keys = list(itertools.islice(self._pending, self._max_size))
+                futures = [self._pending.pop(key) for key in keys]
+            self._executor.submit(self._resolve, keys, futures)
+
+    def _resolve(self, keys, futures):
+        metrics.count("micro_batch.keys", len(keys))
+        try:
+            results = self._function(keys)
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    @property
+    def delay(self):
+        return self._delay
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def close(self):  # anything already submitted is still resolved
+        with self._lock:
+            self._closed = True
+            self._submitted.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    def submit(self, key):  # a future for the result; keys already pending share one future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the batcher is closed")
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = concurrent.futures.Future()
+                if len(self._pending) in (1, self._max_size):  # wake the collector to start a batch, or to send a full one
+                    self._submitted.notify()
+        return future
+
+
+class ReadAhead:  # watches the positions being read and, while reads are sequential, fetches the positions ahead in the background
+    def __init__(self, fetch, limit, min_window=8, max_window=400):
+        self._fetch = fetch  # called with a range of positions from a background thread; errors are counted and otherwise ignored
+        self._limit = limit  # positions are 0 <= position < limit
+        self._min_window = min_window
+        self._max_window = max_window
+        self._window = min_window
+        self._last = None
+        self._step = 0
+        self._frontier = None  # the next position to fetch in the direction of reading
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="bible-read-ahead")
+
+    def _run(self, positions):
+        try:
+            self._fetch(positions)
+        except Exception:  # the reader fetches for itself when it gets there
+            metrics.count("read_ahead.error")
+        else:
+            metrics.count("read_ahead.prefetch", len(positions))
+
+    @property
+    def window(self):
+        return self._window
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def record(self, position):
+        with self._lock:
+            step = position - self._last if self._last is not None else 0
+            self._last = position
+            if step not in (1, -1):  # a jump; wait until reads are sequential again
+                self._step = 0
+                self._window = self._min_window
+                return
+            if step != self._step or (self._frontier - position) * step <= 0:  # a new run, or the reader overtook the prefetched positions
+                if step != self._step:
+                    self._window = self._min_window
+                self._step = step
+                self._frontier = position + step
+            elif (self._frontier - position) * step > self._window // 2 or not 0 <= self._frontier < self._limit:
+                return  # enough has been fetched ahead already, or everything up to the end has
+            else:  # the run is still going so fetch further ahead this time
+                self._window = min(self._window * 2, self._max_window)
+            start = self._frontier
+            if not 0 <= start < self._limit:
+                return
+            stop = min(max(start + step * self._window, -1), self._limit)
+            self._frontier = stop
+        self._executor.submit(self._run, range(start, stop, step))
+
+
+class SingleFlight:
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._futures)
+
+    def claim(self, keys):
+        claimed = {}
+        in_flight = {}
+        with self._lock:
+            for key in keys:
+                future = self._futures.get(key)
+                if future is None:
+                    future = self._futures[key] = concurrent.futures.Future()
+                    claimed[key] = future
+                else:
+                    in_flight[key] = future
+        return claimed, in_flight  # the caller must resolve every claimed key; in flight keys are being resolved by another caller
+
+    def do(self, key, function):
+        claimed, in_flight = self.claim((key, ))
+        if in_flight:
+            return in_flight[key].result()
+        try:
+            result = function()
+        except BaseException as e:
+            self.resolve(key, exception=e)
+            raise
+        self.resolve(key, result)
+        return result
+
+    def resolve(self, key, result=None, exception=None):
+        with self._lock:
+            future = self._futures.pop(key)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
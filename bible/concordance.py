@@ -0,0 +1,191 @@
+import array
+import collections
+import json
+import math
+import struct
+import threading
+
+from bible import cache, utils
+
+
+_HEADER = struct.Struct("=8sII")  # magic, version, length of the JSON metadata (native byte order, like the tables)
+_MAGIC = b"BIBLECNC"
+_POSITION_BITS = 10  # postings pack (ordinal << _POSITION_BITS) | position; no verse comes close to 1024 words
+_VERSION = 1
+
+KWIC = collections.namedtuple("KWIC", ("verse", "left", "match", "right"))
+
+
+class ConcordanceError(Exception):
+    pass
+
+
+class Concordance:  # a positional index of the words of every verse whose text has been added
+    def __init__(self, translation):
+        self._translation = translation
+        self._forms = []  # words as they appear in the text
+        self._form_ids = {}
+        self._form_words = array.array("I")  # form id -> word id
+        self._words = []  # lower case words
+        self._word_ids = {}
+        self._verse_forms = {}  # ordinal -> array of form ids
+        self._postings = {}  # word id -> array of packed (ordinal, position)
+        self._lock = threading.RLock()
+
+    def __contains__(self, ordinal):
+        return ordinal in self._verse_forms
+
+    def __len__(self):
+        return len(self._verse_forms)
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(translation={self._translation.name}, verses={len(self)}, vocabulary={len(self._words)})"
+
+    def _context(self, ordinal, position, size, step):  # up to size words before (step=-1) or after (step=1), crossing verses
+        words = []
+        while len(words) < size and ordinal in self._verse_forms:
+            forms = self._verse_forms[ordinal]
+            positions = range(position, -1, -1) if step < 0 else range(position, len(forms))
+            words.extend(self._forms[forms[index]] for index in positions[:size - len(words)])
+            ordinal += step
+            position = len(self._verse_forms.get(ordinal, ())) - 1 if step < 0 else 0
+        return words[::-1] if step < 0 else words
+
+    def _form_id(self, form):
+        form_id = self._form_ids.get(form)
+        if form_id is None:
+            form_id = self._form_ids[form] = len(self._forms)
+            self._forms.append(form)
+            word = form.lower()
+            word_id = self._word_ids.get(word)
+            if word_id is None:
+                word_id = self._word_ids[word] = len(self._words)
+                self._words.append(word)
+                self._postings[word_id] = array.array("Q")
+            self._form_words.append(word_id)
+        return form_id
+
+    def _occurrences(self, phrase, ordinal_start=0, ordinal_end=None):  # (ordinal, position) of the first word of each match
+        word_ids = [self._word_ids.get(word.lower()) for word in utils.tokenize(phrase)]
+        if not word_ids or None in word_ids:
+            return []
+        anchor = min(range(len(word_ids)), key=lambda index: len(self._postings[word_ids[index]]))  # the rarest word
+        occurrences = []
+        for posting in self._postings[word_ids[anchor]]:
+            ordinal = posting >> _POSITION_BITS
+            position = (posting & ((1 << _POSITION_BITS) - 1)) - anchor
+            if not ordinal_start <= ordinal <= (ordinal_end if ordinal_end is not None else ordinal) or position < 0:
+                continue
+            forms = self._verse_forms[ordinal]
+            if position + len(word_ids) <= len(forms) and all(self._form_words[forms[position + index]] == word_id
+                                                              for index, word_id in enumerate(word_ids)):
+                occurrences.append((ordinal, position))
+        return sorted(occurrences)
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def add(self, ordinal, text):  # indexes the words of a verse body once; later calls for the same verse are ignored
+        with self._lock:
+            if ordinal in self._verse_forms:
+                return
+            forms = array.array("I", map(self._form_id, utils.tokenize(text)))
+            self._verse_forms[ordinal] = forms
+            for position, form_id in enumerate(forms):
+                self._postings[self._form_words[form_id]].append((ordinal << _POSITION_BITS) | position)
+
+    def collocations(self, word, window=5, n=10, min_count=2):  # (word, count, pointwise mutual information) by descending PMI
+        with self._lock:
+            word_id = self._word_ids.get(word.lower())
+            if word_id is None:
+                return []
+            counts = collections.Counter()
+            for posting in self._postings[word_id]:
+                forms = self._verse_forms[posting >> _POSITION_BITS]
+                position = posting & ((1 << _POSITION_BITS) - 1)
+                for index in range(max(position - window, 0), min(position + window + 1, len(forms))):
+                    if index != position:
+                        counts[self._form_words[forms[index]]] += 1
+            total = sum(map(len, self._postings.values()))
+            frequency = len(self._postings[word_id])
+            scores = [(self._words[other_id], count, math.log2(count * total / (frequency * len(self._postings[other_id]))))
+                      for other_id, count in counts.items() if count >= min_count and other_id != word_id]
+        return sorted(scores, key=lambda score: (-score[2], -score[1], score[0]))[:n]
+
+    def count(self, phrase, passage=None):
+        with self._lock:
+            if passage is None:
+                return len(self._occurrences(phrase))
+            return len(self._occurrences(phrase, passage.verse_start.ordinal, passage.verse_end.ordinal))
+
+    def frequency(self, word):
+        with self._lock:
+            word_id = self._word_ids.get(word.lower())
+            return len(self._postings[word_id]) if word_id is not None else 0
+
+    def kwic(self, phrase, context=5, passage=None, by_book=False):
+        length = len(utils.tokenize(phrase))
+        results = []
+        with self._lock:
+            ordinal_range = (passage.verse_start.ordinal, passage.verse_end.ordinal) if passage is not None else (0, None)
+            for ordinal, position in self._occurrences(phrase, *ordinal_range):
+                forms = self._verse_forms[ordinal]
+                results.append(KWIC(
+                    verse=self._translation._verses[ordinal],
+                    left=" ".join(self._context(ordinal, position - 1, context, -1)),
+                    match=" ".join(self._forms[forms[index]] for index in range(position, position + length)),
+                    right=" ".join(self._context(ordinal, position + length, context, 1))
+                ))
+        if not by_book:
+            return results
+        grouped = {}
+        for result in results:
+            grouped.setdefault(result.verse.book.name, []).append(result)
+        return grouped
+
+    def save(self, file_path):  # vocabulary as JSON, then the form ids of every verse and the postings of every word as packed arrays
+        with self._lock:
+            ordinals = array.array("I", sorted(self._verse_forms))
+            verse_offsets = array.array("Q", [0])
+            verse_forms = array.array("I")
+            for ordinal in ordinals:
+                verse_forms.extend(self._verse_forms[ordinal])
+                verse_offsets.append(len(verse_forms))
+            metadata = {"translation": self._translation.name, "forms": self._forms, "tables": {}}
+            tables = {"form_words": self._form_words, "ordinals": ordinals, "verse_offsets": verse_offsets, "verse_forms": verse_forms}
+            for name, table in tables.items():
+                metadata["tables"][name] = [table.typecode, len(table)]
+        encoded_metadata = json.dumps(metadata).encode()
+        content = bytearray(_HEADER.pack(_MAGIC, _VERSION, len(encoded_metadata)))
+        content += encoded_metadata
+        for table in tables.values():
+            content += table.tobytes()
+        cache.atomic_write(file_path, bytes(content))
+
+    @classmethod
+    def load(cls, file_path, translation):  # postings are rebuilt from the verses rather than stored, which keeps the file compact
+        with open(file_path, "rb") as f:
+            content = f.read()
+        magic, version, metadata_length = _HEADER.unpack_from(content)
+        if magic != _MAGIC or version != _VERSION:
+            raise ConcordanceError(f"{file_path} is not a version {_VERSION} concordance file")
+        metadata = json.loads(content[_HEADER.size:_HEADER.size + metadata_length])
+        if metadata["translation"] != translation.name:
+            raise ConcordanceError(f"{file_path} indexes the {metadata['translation']} translation rather than {translation.name}")
+        tables = {}
+        position = _HEADER.size + metadata_length
+        for name, (typecode, length) in metadata["tables"].items():
+            tables[name] = array.array(typecode)
+            tables[name].frombytes(content[position:position + length * tables[name].itemsize])
+            position += length * tables[name].itemsize
+        concordance = cls(translation)
+        for form in metadata["forms"]:
+            concordance._form_id(form)
+        verse_offsets = tables["verse_offsets"]
+        for index, ordinal in enumerate(tables["ordinals"]):
+            forms = tables["verse_forms"][verse_offsets[index]:verse_offsets[index + 1]]
+            concordance._verse_forms[ordinal] = forms
+            for word_position, form_id in enumerate(forms):
+                concordance._postings[concordance._form_words[form_id]].append((ordinal << _POSITION_BITS) | word_position)
+        return concordance
@@ -0,0 +1,97 @@
+import array
+import mmap
+import struct
+
+from bible import cache
+
+
+_FIELDS = ("title", "body", "footnotes")
+_HEADER = struct.Struct("=8sII")  # magic, version, number of verses (native byte order, like the offset tables)
+_MAGIC = b"BIBLECRP"
+_VERSION = 1
+
+
+class CorpusError(Exception):
+    pass
+
+
+class Corpus:
+    def __init__(self, file_path):
+        self._file_path = file_path
+        with open(file_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise CorpusError(f"{file_path} is not a version {_VERSION} corpus file")
+        self._count = count
+        self._view = memoryview(self._mmap)
+        self._offsets = {}
+        self._blob_starts = {}
+        position = _HEADER.size
+        offsets_size = (count + 1) * 8
+        for field in _FIELDS:
+            self._offsets[field] = self._view[position:position + offsets_size].cast("Q")
+            position += offsets_size
+        for field in _FIELDS:
+            self._blob_starts[field] = position
+            position += self._offsets[field][-1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __getitem__(self, ordinal):
+        return tuple(self._read(field, ordinal) for field in _FIELDS)
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return f"Corpus(file_path={self._file_path}, len={self._count})"
+
+    def _read(self, field, ordinal):
+        if not 0 <= ordinal < self._count:
+            raise IndexError(ordinal)
+        offsets = self._offsets[field]
+        start = self._blob_starts[field] + offsets[ordinal]
+        end = self._blob_starts[field] + offsets[ordinal + 1]
+        return str(self._view[start:end], "utf-8") or None  # empty fields were written from None
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def body(self, ordinal):
+        return self._read("body", ordinal)
+
+    def close(self):
+        for offsets in self._offsets.values():
+            offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+    def footnotes(self, ordinal):
+        return self._read("footnotes", ordinal)
+
+    def title(self, ordinal):
+        return self._read("title", ordinal)
+
+
+def write(file_path, rows):
+    blobs = {field: bytearray() for field in _FIELDS}
+    offsets = {field: array.array("Q", [0]) for field in _FIELDS}
+    count = 0
+    for row in rows:  # (title, body, footnotes) in ordinal order
+        for field, value in zip(_FIELDS, row):
+            blobs[field] += (value or "").encode()
+            offsets[field].append(len(blobs[field]))
+        count += 1
+    content = bytearray(_HEADER.pack(_MAGIC, _VERSION, count))
+    for field in _FIELDS:
+        content += offsets[field].tobytes()
+    for field in _FIELDS:
+        content += blobs[field]
+    cache.atomic_write(file_path, bytes(content))
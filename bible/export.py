@@ -0,0 +1,134 @@
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import os
+import sys
+
+import bible
+from bible import snapshot, utils
+
+
+_DEFAULT_BATCH_SIZE = 400  # the most verses the ESV API returns per text query
+_FORMATS = ("csv", "jsonl", "parquet")
+_SCHEMAS = {  # column types for parquet; any other column is a string
+    "verses": {"ordinal": "int64", "chapter": "int64", "verse": "int64"},
+    "books": {"number": "int64", "alt_names": "list<string>", "categories": "list<string>"},
+    "characters": {"number": "int64", "age": "int64", "born": "int64", "died": "int64", "mother": "int64", "father": "int64",
+                   "spouses": "list<int64>", "aliases": "list<string>", "passages": "list<string>"}
+}
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(itertools.islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(iterator, size))
+
+
+def _exportable(value):
+    if value is utils.UNKNOWN:
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_exportable(item) for item in value]
+    if isinstance(value, int):
+        return int(value)  # utils.Year
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def book_rows(translation):
+    for book in translation.books():
+        yield {"number": book.number, "name": book.name, "alt_names": list(book.alt_names), "categories": list(book.categories),
+               "author": book.author, "language": book.language}
+
+
+def character_rows(translation):
+    fields = [field.name for field in dataclasses.fields(translation.Character) if field.name != "translation"]
+    for character in translation.characters():
+        yield {field.lstrip("_"): _exportable(getattr(character, field)) for field in fields}
+
+
+def verse_rows(translation, text=True, batch_size=_DEFAULT_BATCH_SIZE):
+    for verses in _batches(translation._verses, batch_size):
+        texts = translation.texts(verses) if text else itertools.repeat(None)
+        for verse, verse_text in zip(verses, texts):
+            row = {"ordinal": verse.ordinal, "book": verse.book.name, "chapter": verse.chapter.number, "verse": verse.number}
+            if text:
+                row["body"] = verse_text.body
+                row["title"] = verse_text.title
+            yield row
+
+
+def write_csv(file_path, rows):  # lists are written as JSON
+    with open(file_path, "w", newline="") as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({key: json.dumps(value) if isinstance(value, list) else value for key, value in row.items()})
+
+
+def write_jsonl(file_path, rows):
+    with open(file_path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def write_parquet(file_path, rows, column_types=None, batch_size=_DEFAULT_BATCH_SIZE):
+    pyarrow = utils.import_optional("pyarrow", "parquet")
+    parquet = utils.import_optional("pyarrow.parquet", "parquet")
+    column_types = column_types or {}
+    types = {"int64": pyarrow.int64(), "string": pyarrow.string(), "list<int64>": pyarrow.list_(pyarrow.int64()),
+             "list<string>": pyarrow.list_(pyarrow.string())}
+    writer = None
+    try:
+        for batch in _batches(rows, batch_size):
+            if writer is None:
+                schema = pyarrow.schema([(column, types[column_types.get(column, "string")]) for column in batch[0]])
+                writer = parquet.ParquetWriter(file_path, schema)
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export(translation, directory, format_="jsonl", text=True):
+    if format_ not in _FORMATS:
+        raise ValueError(f"{format_} is not one of the supported formats, {', '.join(_FORMATS)}")
+    os.makedirs(directory, exist_ok=True)
+    tables = {"books": book_rows(translation), "characters": character_rows(translation), "verses": verse_rows(translation, text)}
+    file_paths = {}
+    for table, rows in tables.items():
+        file_paths[table] = os.path.join(directory, f"{table}.{format_}")
+        if format_ == "parquet":
+            write_parquet(file_paths[table], rows, _SCHEMAS[table])
+        else:
+            (write_csv if format_ == "csv" else write_jsonl)(file_paths[table], rows)
+    return file_paths
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bible.export", description="Export the books, characters and verses of the ESV translation.")
+    parser.add_argument("directory", help="where to write books.<format>, characters.<format> and verses.<format>")
+    parser.add_argument("--format", choices=_FORMATS, default="jsonl", help="(default: jsonl)")
+    parser.add_argument("--no-text", action="store_true", help="export the verse structure without fetching any text")
+    parser.add_argument("--snapshot", help="attach to this snapshot (see bible.snapshot) rather than loading the translation")
+    parser.add_argument("--text", help="read text from this corpus file (see Translation.dump_text) rather than the ESV API")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    translation = snapshot.attach(args.snapshot) if args.snapshot is not None else bible.esv()
+    if args.text is not None:
+        translation.load_text(args.text)
+    for file_path in export(translation, args.directory, args.format, not args.no_text).values():
+        print(file_path, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
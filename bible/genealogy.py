@@ -0,0 +1,166 @@
+import array
+import collections
+import heapq
+
+from bible import utils
+
+
+class Genealogy:  # the family graph as compressed sparse rows over dense character indices, in the order characters were registered
+    def __init__(self, translation, parents, children, spouses):
+        self._translation = translation
+        self._characters = tuple(translation._characters.values())
+        self._indices = {character.number: index for index, character in enumerate(self._characters)}
+        self._parents = parents  # (offsets, indices) pairs; row i holds the neighbours of character i
+        self._children = children
+        self._spouses = spouses
+        self._depths, self._order = self._compute_depths()
+        self._components = self._compute_components()
+        self._descendant_counts = self._compute_descendant_counts()
+
+    def __len__(self):
+        return len(self._characters)
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(translation={self._translation.name}, characters={len(self)}, components={len(set(self._components))})"
+
+    @classmethod
+    def build(cls, translation):
+        indices = {number: index for index, number in enumerate(translation._characters)}
+        parent_rows = [[indices[number] for number in (character._mother, character._father) if number in indices]  # mother first, like parents
+                       for character in translation._characters.values()]
+        child_rows = [[] for _ in parent_rows]
+        for index, parent_row in enumerate(parent_rows):
+            for parent_index in parent_row:
+                child_rows[parent_index].append(index)
+        spouse_rows = [[indices[number] for number in character._spouses if number in indices] for character in translation._characters.values()]
+        return cls(translation, *map(cls._compress, (parent_rows, child_rows, spouse_rows)))
+
+    @staticmethod
+    def _compress(rows):
+        offsets = array.array("I", [0])
+        indices = array.array("I")
+        for row in rows:
+            indices.extend(row)
+            offsets.append(len(indices))
+        return offsets, indices
+
+    @staticmethod
+    def _row(edges, index):
+        offsets, indices = edges
+        return indices[offsets[index]:offsets[index + 1]]
+
+    def _compute_components(self):  # connected by any parent, child or spouse edge
+        components = array.array("I", range(len(self)))
+
+        def find(index):
+            while components[index] != index:
+                components[index] = components[components[index]]
+                index = components[index]
+            return index
+
+        for index in range(len(self)):
+            for other_index in (*self._row(self._parents, index), *self._row(self._spouses, index)):
+                root, other_root = find(index), find(other_index)
+                if root != other_root:
+                    components[max(root, other_root)] = min(root, other_root)
+        for index in range(len(self)):
+            components[index] = find(index)
+        return components
+
+    def _compute_depths(self):  # generations below the furthest known ancestor, and an order that visits parents before their children
+        depths = array.array("I", bytes(array.array("I").itemsize * len(self)))
+        waiting_parents = [len(self._row(self._parents, index)) for index in range(len(self))]
+        ready = collections.deque(index for index, count in enumerate(waiting_parents) if not count)
+        order = array.array("I")
+        while ready:
+            index = ready.popleft()
+            order.append(index)
+            for child_index in self._row(self._children, index):
+                depths[child_index] = max(depths[child_index], depths[index] + 1)
+                waiting_parents[child_index] -= 1
+                if not waiting_parents[child_index]:
+                    ready.append(child_index)
+        if len(order) != len(self):
+            raise utils.BibleSetupError(f"the genealogy of this translation ({self._translation}) has a cycle")
+        return depths, order
+
+    def _compute_descendant_counts(self):  # descendants as bit sets, so descendants reached through both parents are counted once
+        descendants = [0] * len(self)
+        for index in reversed(self._order):
+            for child_index in self._row(self._children, index):
+                descendants[index] |= descendants[child_index] | (1 << child_index)
+        return array.array("I", (bin(bits).count("1") for bits in descendants))
+
+    def _index(self, character):
+        return self._indices[character.number]
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def arrays(self):  # numpy views of every table, for vectorised analytics
+        numpy = utils.import_optional("numpy", "numpy")
+        tables = {"depths": self._depths, "components": self._components, "descendant_counts": self._descendant_counts,
+                  "numbers": array.array("I", (character.number for character in self._characters))}
+        for name, (offsets, indices) in (("parent", self._parents), ("child", self._children), ("spouse", self._spouses)):
+            tables[f"{name}_offsets"] = offsets
+            tables[f"{name}_indices"] = indices
+        return {name: numpy.frombuffer(table, dtype=numpy.uint32) for name, table in tables.items()}
+
+    def children(self, character):
+        return tuple(self._characters[index] for index in self._row(self._children, self._index(character)))
+
+    def component(self, character):  # everyone connected to the character by blood or marriage
+        component = self._components[self._index(character)]
+        return tuple(other for index, other in enumerate(self._characters) if self._components[index] == component)
+
+    def deepest_lineages(self, n=10):  # the n longest chains of known ancestry, each from its furthest ancestor down
+        lineages = []
+        for index in heapq.nlargest(n, range(len(self)), key=self._depths.__getitem__):
+            lineage = [index]
+            while self._depths[lineage[-1]]:  # some parent is exactly one generation shallower
+                depth = self._depths[lineage[-1]]
+                lineage.append(next(parent for parent in self._row(self._parents, lineage[-1]) if self._depths[parent] == depth - 1))
+            lineages.append(tuple(self._characters[index] for index in reversed(lineage)))
+        return lineages
+
+    def depth(self, character):
+        return self._depths[self._index(character)]
+
+    def descendant_count(self, character):
+        return self._descendant_counts[self._index(character)]
+
+    def largest_families(self, n=10, by="descendants"):  # (character, count) by number of descendants or of children
+        if by not in ("children", "descendants"):
+            raise ValueError(f"{by} is not one of the supported measures, children, descendants")
+        counts = self._descendant_counts if by == "descendants" else [len(self._row(self._children, index)) for index in range(len(self))]
+        return [(self._characters[index], counts[index]) for index in heapq.nlargest(n, range(len(self)), key=counts.__getitem__)]
+
+    def parents(self, character):
+        return tuple(self._characters[index] for index in self._row(self._parents, self._index(character)))
+
+    def siblings(self, character):  # anyone sharing a parent, in registration order
+        index = self._index(character)
+        sibling_indices = dict.fromkeys(child for parent in self._row(self._parents, index) for child in self._row(self._children, parent))
+        sibling_indices.pop(index, None)
+        return tuple(self._characters[sibling_index] for sibling_index in sorted(sibling_indices))
+
+    def spouses(self, character):
+        return tuple(self._characters[index] for index in self._row(self._spouses, self._index(character)))
+
+    def within(self, character, k, spouses=False):  # everyone within k parent or child steps (or marriages, if spouses) of the character
+        start = self._index(character)
+        distances = {start: 0}
+        frontier = [start]
+        for distance in range(1, k + 1):
+            next_frontier = []
+            for index in frontier:
+                neighbours = (*self._row(self._parents, index), *self._row(self._children, index),
+                              *(self._row(self._spouses, index) if spouses else ()))
+                for neighbour in neighbours:
+                    if neighbour not in distances:
+                        distances[neighbour] = distance
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        del distances[start]
+        return {self._characters[index]: distance for index, distance in sorted(distances.items(), key=lambda item: (item[1], item[0]))}
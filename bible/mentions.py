@@ -0,0 +1,172 @@
+import array
+import collections
+import concurrent.futures
+import os
+import re
+
+from bible import corpus, utils
+
+
+_POSSESSIVE_REGEX = re.compile(r"['’]s?$")
+
+_automaton = None  # built once per worker process by _initialise
+
+
+class Automaton:  # Aho-Corasick over words, so every name is found in one pass over a verse and only at word boundaries
+    def __init__(self, patterns):  # a sequence of word tuples; matches report the index of the pattern
+        self._goto = [{}]
+        self._outputs = [()]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for word in pattern:
+                if word not in self._goto[state]:
+                    self._goto[state][word] = len(self._goto)
+                    self._goto.append({})
+                    self._outputs.append(())
+                state = self._goto[state][word]
+            self._outputs[state] += (index, )
+        self._fail = array.array("I", bytes(array.array("I").itemsize * len(self._goto)))
+        states = collections.deque(self._goto[0].values())  # the first words of patterns fail back to the root
+        while states:  # breadth first, so the failure state of a parent is always known before its children
+            state = states.popleft()
+            for word, next_state in self._goto[state].items():
+                states.append(next_state)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(word, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def search(self, words):  # the indexes of the patterns found, in order of where they end
+        state = 0
+        for word in words:
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            yield from self._outputs[state]
+
+
+class MentionIndex:  # the characters mentioned by each verse ordinal, stored as compressed rows (offsets into one table of numbers)
+    def __init__(self, translation, offsets, numbers):
+        self._translation = translation
+        self._offsets = offsets
+        self._numbers = numbers
+        self._ordinals = None
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(translation={self._translation.name}, mentions={len(self)})"
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def character_numbers(self, ordinal):
+        return self._numbers[self._offsets[ordinal]:self._offsets[ordinal + 1]]
+
+    def ordinals(self, character_number):
+        if self._ordinals is None:  # the transpose, built on first use
+            ordinals = collections.defaultdict(lambda: array.array("I"))
+            for ordinal in range(len(self._offsets) - 1):
+                for number in self.character_numbers(ordinal):
+                    ordinals[number].append(ordinal)
+            self._ordinals = dict(ordinals)
+        return self._ordinals.get(character_number, array.array("I"))
+
+
+def _initialise(patterns):
+    global _automaton
+    _automaton = Automaton(patterns)
+
+
+def _words(text):
+    return [_POSSESSIVE_REGEX.sub("", word) for word in utils.tokenize(text or "")]
+
+
+def _scan(source):  # a corpus file path and ordinal range, or (ordinal, text) pairs; returns (ordinal, pattern indexes) pairs
+    if isinstance(source[0], str):
+        file_path, start, end = source
+        with corpus.Corpus(file_path) as text_corpus:
+            texts = [(ordinal, text_corpus.body(ordinal)) for ordinal in range(start, end + 1)]
+    else:
+        texts = source
+    return [(ordinal, tuple(set(_automaton.search(_words(text))))) for ordinal, text in texts]
+
+
+def _patterns(translation):  # each distinct name (or alias) as words, with the numbers of every character that goes by it
+    names = collections.defaultdict(list)
+    for character in translation.characters():
+        for name in (character.name, *character.aliases):
+            words = tuple(_words(name)) if isinstance(name, str) and not name.startswith("(") else ()  # (Cain's Wife) is a description
+            if words:
+                names[words].append(character.number)
+    return list(names), list(names.values())
+
+
+def _places(translation):
+    return {place for character in translation.characters() for place in (character.nationality, character.place_of_death) if isinstance(place, str)}
+
+
+def _vouched_ordinals(translation, character_number):  # (start, end) ordinals of the whole chapters the curated passages place the character in
+    last_ordinal = len(translation._verses) - 1
+    ranges = []
+    for passage in translation._characters[character_number].passages or ():
+        end_chapter = passage.verse_end.chapter
+        if passage.verse_end.ordinal == last_ordinal:  # open-ended (the character's story has no known end), so only its first chapter
+            end_chapter = passage.verse_start.chapter
+        ranges.append((passage.verse_start.chapter.first().ordinal, end_chapter.last().ordinal))
+    return ranges
+
+
+def build(translation, texts, workers=None):  # texts is a corpus (or its file path) or a mapping of ordinal to verse body
+    patterns, pattern_numbers = _patterns(translation)
+    lowercase_patterns = {(pattern[0].lower(), ): index for index, pattern in enumerate(patterns) if len(pattern) == 1 and not pattern[0].islower()}
+    lowercase_indexes = dict(enumerate(lowercase_patterns.values(), len(patterns)))  # found only to tell us which names are also ordinary words
+    patterns += list(lowercase_patterns)
+    sources = []
+    for book in translation.books():  # one task per book
+        start, end = book.first().first().ordinal, book.last().last().ordinal
+        if isinstance(texts, (str, corpus.Corpus)):
+            sources.append((texts if isinstance(texts, str) else texts.file_path, start, end))
+        else:
+            book_texts = [(ordinal, texts[ordinal]) for ordinal in range(start, end + 1) if ordinal in texts]
+            if book_texts:
+                sources.append(book_texts)
+    if workers == 1:
+        _initialise(patterns)
+        results = list(map(_scan, sources))
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_initialise, initargs=(patterns, ))
+        with executor:
+            results = list(executor.map(_scan, sources))
+    scanned = [(ordinal, indexes) for result in results for ordinal, indexes in result]
+    # a one word name that is also a place or an ordinary word (Egypt, Put, Lot) is only a mention where the curated passages place its character
+    places = _places(translation)
+    ambiguous = {lowercase_indexes[index] for _, indexes in scanned for index in indexes if index in lowercase_indexes}
+    ambiguous.update(index for index, pattern in enumerate(patterns[:len(pattern_numbers)]) if len(pattern) == 1 and pattern[0] in places)
+    vouched_ordinals = {number: _vouched_ordinals(translation, number) for index in ambiguous for number in pattern_numbers[index]}
+    mentions = {}
+    for ordinal, indexes in scanned:
+        numbers = set()
+        for index in indexes:
+            if index in lowercase_indexes:
+                continue
+            candidates = pattern_numbers[index]
+            if len(candidates) > 1:  # characters sharing a name are told apart by their curated passages, if any of them covers the verse
+                covering = set(candidates) & set(translation._character_index.overlapping(ordinal, ordinal))
+                candidates = covering or candidates
+            if index in ambiguous:
+                candidates = [number for number in candidates if any(start <= ordinal <= end for start, end in vouched_ordinals[number])]
+            numbers.update(candidates)
+        mentions[ordinal] = sorted(numbers)
+    offsets = array.array("I", [0])
+    numbers = array.array("I")
+    for ordinal in range(len(translation._verses)):
+        numbers.extend(mentions.get(ordinal, ()))
+        offsets.append(len(numbers))
+    return MentionIndex(translation, offsets, numbers)
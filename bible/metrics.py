@@ -0,0 +1,174 @@
+import bisect
+import collections
+import functools
+import inspect
+import threading
+import time
+
+
+Event = collections.namedtuple("Event", ("kind", "name", "value", "attributes", "start_time_ns"))
+_subscribers = []
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self._name = name
+        self._attributes = attributes
+        self._start = None
+        self._start_time_ns = None
+
+    def __enter__(self):
+        self._start_time_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *_):
+        duration = time.perf_counter() - self._start
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):  # an abandoned generator is not an error
+            self._attributes["error"] = exc_type.__name__
+        _emit(Event("span", self._name, duration, self._attributes, self._start_time_ns))
+        return False
+
+    def set(self, **attributes):
+        self._attributes.update(attributes)
+
+
+class Histogram:
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.max = 0
+        self.sum = 0
+
+    def __repr__(self):
+        return f"Histogram(count={self.count}, mean={self.mean:.6f}, p50={self.quantile(0.5)}, p99={self.quantile(0.99)}, max={self.max:.6f})"
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+        self.sum += value
+
+    def quantile(self, q):  # the upper bound of the bucket holding the quantile (or the max for the overflow bucket)
+        rank = q * self.count
+        cumulative = 0
+        for bucket, count in zip(self.BUCKETS + (self.max, ), self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min(bucket, self.max)
+        return 0
+
+
+class Recorder:
+    def __init__(self):
+        self._counters = collections.Counter()
+        self._histograms = collections.defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.name, tuple(sorted(event.attributes.items())))
+        with self._lock:
+            if event.kind == "counter":
+                self._counters[key] += event.value
+            else:
+                self._histograms[key].observe(event.value)
+
+    @property
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    @property
+    def histograms(self):
+        with self._lock:
+            return dict(self._histograms)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+class OpenTelemetrySubscriber:  # duck-typed so that opentelemetry is not a dependency
+    def __init__(self, tracer):
+        self._tracer = tracer
+
+    def __call__(self, event):
+        if event.kind != "span":
+            return
+        span = self._tracer.start_span(event.name, start_time=event.start_time_ns, attributes=event.attributes)
+        span.end(end_time=event.start_time_ns + int(event.value * 1e9))
+
+
+def _emit(event):
+    for subscriber in tuple(_subscribers):
+        subscriber(event)
+
+
+def _timed_generator(generator, name, attributes):
+    with Span(name, dict(attributes)):
+        yield from generator
+
+
+def count(name, value=1, **attributes):
+    if _subscribers:
+        _emit(Event("counter", name, value, attributes, time.time_ns()))
+
+
+def enabled():
+    return bool(_subscribers)
+
+
+def span(name, **attributes):
+    if not _subscribers:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def subscribe(subscriber):
+    _subscribers.append(subscriber)
+    return subscriber
+
+
+def timed(name, **attributes):
+    def decorator(function):
+        if inspect.isgeneratorfunction(function):  # time the whole iteration rather than the creation of the generator
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                if not _subscribers:
+                    return function(*args, **kwargs)
+                return _timed_generator(function(*args, **kwargs), name, attributes)
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _subscribers:
+                return function(*args, **kwargs)
+            with Span(name, dict(attributes)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def unsubscribe(subscriber):
+    _subscribers.remove(subscriber)
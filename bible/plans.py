@@ -0,0 +1,73 @@
+import array
+import bisect
+import itertools
+
+from bible import corpus, utils
+
+
+_BOUNDARIES = ("verse", "section", "chapter", "book")  # where a segment may start; a section starts at each verse with a heading
+
+
+class ReadingPlanner:  # splits passages into segments of similar length using cumulative word counts per verse ordinal
+    def __init__(self, translation, cumulative_words, section_starts):
+        self._translation = translation
+        self._cumulative_words = cumulative_words  # the number of words before each ordinal, plus the total at the end
+        self._starts = {
+            "verse": range(len(translation._verses)),
+            "section": section_starts,
+            "chapter": array.array("I", (verse.ordinal for verse in translation._verses if verse.number == 1)),
+            "book": array.array("I", (book.first().first().ordinal for book in translation.books()))
+        }
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(translation={self._translation.name}, words={self._cumulative_words[-1]})"
+
+    @classmethod
+    def build(cls, translation, text_corpus=None):
+        text_corpus = text_corpus or translation._corpus
+        if text_corpus is None:
+            raise ValueError("a text corpus is required; call translation.load_text() (or pass a corpus.Corpus) first")
+        if isinstance(text_corpus, str):
+            text_corpus = corpus.Corpus(text_corpus)
+        word_counts = (len(utils.tokenize(utils.strip_markers(text_corpus.body(ordinal) or ""))) for ordinal in range(len(translation._verses)))
+        cumulative_words = array.array("Q", itertools.accumulate(word_counts, initial=0))
+        section_starts = array.array("I", (ordinal for ordinal in range(len(translation._verses)) if text_corpus.title(ordinal) is not None))
+        return cls(translation, cumulative_words, section_starts)
+
+    def _passage(self, ordinal_start, ordinal_end):
+        verse_start = self._translation._verses[ordinal_start]
+        verse_end = self._translation._verses[ordinal_end]
+        return self._translation.Passage(verse_start.book, verse_start.chapter, verse_start, verse_end.book, verse_end.chapter, verse_end)
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def split(self, passage, n, boundary="verse"):  # n contiguous passages with as close to equal word counts as the boundaries allow
+        if boundary not in _BOUNDARIES:
+            raise ValueError(f"{boundary} is not one of the supported boundaries, {', '.join(_BOUNDARIES)}")
+        start = passage.verse_start.ordinal
+        end = passage.verse_end.ordinal + 1  # exclusive from here on
+        starts = self._starts[boundary]
+        first = bisect.bisect_right(starts, start)  # segments after the first may only start at allowed boundaries inside the passage
+        last = bisect.bisect_left(starts, end)
+        if last - first < n - 1:
+            raise ValueError(f"{passage} can only be split at {last - first} {boundary} boundaries, too few for {n} passages")
+        cumulative_words = self._cumulative_words
+        words_start = cumulative_words[start]
+        words = cumulative_words[end] - words_start
+        segment_starts = [start]
+        for segment in range(1, n):
+            target = words_start + words * segment / n
+            ordinal = bisect.bisect_left(cumulative_words, target, start, end)  # the first ordinal at or past the target
+            index = bisect.bisect_left(starts, ordinal, first, last)
+            if index > first and (index == last or target - cumulative_words[starts[index - 1]] < cumulative_words[starts[index]] - target):
+                index -= 1  # the boundary before the target is closer
+            index = min(max(index, first), last - (n - segment))  # leave a boundary for every remaining segment
+            segment_starts.append(starts[index])
+            first = index + 1
+        segment_starts.append(end)
+        return [self._passage(segment_start, segment_end - 1) for segment_start, segment_end in zip(segment_starts, segment_starts[1:])]
+
+    def word_count(self, passage):
+        return self._cumulative_words[passage.verse_end.ordinal + 1] - self._cumulative_words[passage.verse_start.ordinal]
@@ -0,0 +1,42 @@
+from bible import cache, utils
+
+
+_LOADERS = {}
+_LOADS = cache.SingleFlight()
+_TRANSLATIONS = {}
+
+
+def _load(key):
+    translation = _TRANSLATIONS.get(key)  # another caller may have finished loading between our check and claiming the load
+    if translation is None:
+        translation = _TRANSLATIONS[key] = _LOADERS[key]()
+    return translation
+
+
+def get(name):
+    key = name.lower()
+    translation = _TRANSLATIONS.get(key)
+    if translation is None:
+        if key not in _LOADERS:
+            raise KeyError(f"no translation is registered with the name, {name}")
+        translation = _LOADS.do(key, lambda: _load(key))
+    return translation
+
+
+def loaded():
+    return tuple(_TRANSLATIONS)
+
+
+def names():
+    return tuple(_LOADERS)
+
+
+def register(name, loader):  # replacing a loader discards any translation it has already loaded
+    key = name.lower()
+    _LOADERS[key] = loader
+    _TRANSLATIONS.pop(key, None)
+
+
+def unload(name):
+    utils.clear_data_cache()  # the next load parses the data files again rather than the process holding them indefinitely
+    return _TRANSLATIONS.pop(name.lower(), None)
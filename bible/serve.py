@@ -0,0 +1,268 @@
+import argparse
+import concurrent.futures
+import hashlib
+import http
+import http.server
+import itertools
+import json
+import sys
+import urllib.parse
+
+import bible
+from bible import api, cache, corpus, metrics, snapshot, utils
+from bible.translations.esv import api as esv_api
+
+
+_CHARACTER_FIELDS = ("number", "name", "aliases", "gender", "age", "born", "died", "cause_of_death", "place_of_death", "nationality",
+                     "primary_occupation", "father", "mother", "spouses", "children", "passages")
+_CHARACTER_RESERVED_PARAMETERS = ("limit", "passage", "q")
+_DEFAULT_CACHE_SIZE = 1024
+_DEFAULT_HOST = "127.0.0.1"
+_DEFAULT_LIMIT = 20
+_DEFAULT_PORT = 8000
+_DEFAULT_WORKERS = 8
+_MAX_BATCH_SIZE = 500
+_MAX_LIMIT = 100
+
+
+class ServeError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _bool(value):
+    return value.lower() not in ("0", "false", "no")
+
+
+def _etag(*parts):
+    return f'"{hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:32]}"'
+
+
+def _first(query, name, default=None):
+    return query.get(name, (default, ))[0]
+
+
+def _jsonable(value):
+    if value is utils.UNKNOWN:
+        return None
+    if isinstance(value, api.Character):
+        return value.number
+    if isinstance(value, api.Passage):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _limit(query):
+    limit = _first(query, "limit", str(_DEFAULT_LIMIT))
+    if not limit.isdigit() or not 0 < int(limit) <= _MAX_LIMIT:
+        raise ServeError(http.HTTPStatus.BAD_REQUEST, f"limit must be a number between 1 and {_MAX_LIMIT}")
+    return int(limit)
+
+
+class Service:
+    def __init__(self, translation, fallback_corpus=None, cache_size=_DEFAULT_CACHE_SIZE):
+        self._translation = translation
+        self._fallback_corpus = fallback_corpus
+        self._responses = cache.LRUCache(cache_size)
+        self._routes = {"/characters": self._characters, "/passages": self._passages, "/search": self._search}
+
+    def _characters(self, query):
+        passage_reference = _first(query, "passage")
+        limit = _limit(query)
+        etag = _etag(self._translation.name, "characters", sorted(query.items()))
+
+        def compute():
+            characters = (self._passage(passage_reference) if passage_reference is not None else self._translation).characters()
+            for field, values in query.items():
+                if field in _CHARACTER_RESERVED_PARAMETERS:
+                    continue
+                if field not in characters.fields:
+                    raise ServeError(http.HTTPStatus.BAD_REQUEST, f"characters cannot be filtered by {field}")
+                if values[0].lower() in ("true", "false"):
+                    characters = getattr(characters, field).true() if _bool(values[0]) else getattr(characters, field).false()
+                else:
+                    characters = getattr(characters, field).any(*map(utils.safe_int, values))
+            if "q" in query:
+                characters = characters.name.like(*query["q"])
+            return {"characters": [{field: _jsonable(value) for field, value in character.items()}
+                                   for character in characters.select(*_CHARACTER_FIELDS, limit=limit)]}, True
+        return etag, compute
+
+    def _passage(self, reference=None, int_reference=None):
+        try:
+            return self._translation.passage(reference, int_reference)
+        except (utils.BibleReferenceError, KeyError, ValueError) as e:
+            raise ServeError(http.HTTPStatus.BAD_REQUEST, f"invalid reference: {e}")
+
+    def _passages(self, query):
+        passages = [*(self._passage(reference) for reference in query.get("q", ())),
+                    *(self._passage(int_reference=int_reference) for int_reference in query.get("int_reference", ()))]
+        if not 0 < len(passages) <= _MAX_BATCH_SIZE:
+            raise ServeError(http.HTTPStatus.BAD_REQUEST, f"between 1 and {_MAX_BATCH_SIZE} references (q or int_reference) are required")
+        include_text = _bool(_first(query, "text", "true"))
+        etag = _etag(self._translation.name, "passages", [passage.int_reference for passage in passages], include_text)
+
+        def compute():
+            results = [{"reference": str(passage), "int_reference": passage.int_reference} for passage in passages]
+            if not include_text:
+                return {"passages": results}, True
+            verse_lists = [list(passage.verses()) for passage in passages]
+            texts, source = self._texts(list(dict.fromkeys(itertools.chain.from_iterable(verse_lists))))  # one batch across every passage
+            for result, verses in zip(results, verse_lists):
+                result["text"] = " ".join(texts[verse].body for verse in verses)
+            return {"passages": results, "source": source}, source != "fallback"
+        return etag, compute
+
+    def _search(self, query):
+        search_query = _first(query, "q")
+        if not search_query:
+            raise ServeError(http.HTTPStatus.BAD_REQUEST, "q is required")
+        limit = _limit(query)
+        etag = _etag(self._translation.name, "search", search_query, limit)
+
+        def compute():
+            try:
+                verses = list(itertools.islice(self._translation.search(search_query), limit))
+            except (esv_api.ESVError, OSError) as e:
+                raise ServeError(http.HTTPStatus.BAD_GATEWAY, f"the ESV API is unavailable: {e}")
+            texts, source = self._texts(verses)  # errors fetching text become a 502 (or the fallback) like those from search()
+            results = [{"reference": str(verse), "int_reference": verse.int_reference, "text": texts[verse].body} for verse in verses]
+            return {"results": results, "source": source}, source != "fallback"
+        return etag, compute
+
+    def _texts(self, verses):
+        try:
+            return dict(zip(verses, self._translation.texts(verses))), "corpus" if self._translation._corpus is not None else "esv"
+        except (esv_api.ESVError, OSError) as e:
+            if self._fallback_corpus is None:
+                raise ServeError(http.HTTPStatus.BAD_GATEWAY, f"the ESV API is unavailable: {e}")
+            metrics.count("serve.fallback")
+            return {verse: esv_api.ESVText.from_parts(*self._fallback_corpus[verse.ordinal]) for verse in verses}, "fallback"
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def respond(self, path, query, if_none_match=None):  # (status, etag, body, cacheable); no etag is given for a body that must not be cached
+        route = self._routes.get(path.rstrip("/"))
+        if route is None:
+            return http.HTTPStatus.NOT_FOUND, None, json.dumps({"error": f"{path} does not exist"}).encode(), False
+        with metrics.span("serve.request", route=path.rstrip("/")) as span:
+            try:
+                etag, compute = route(query)
+                if if_none_match is not None and etag in if_none_match:
+                    span.set(status=http.HTTPStatus.NOT_MODIFIED.value)
+                    return http.HTTPStatus.NOT_MODIFIED, etag, b"", True
+                body = self._responses.get(etag)
+                metrics.count("cache.miss" if body is None else "cache.hit", cache="response")
+                cacheable = True
+                if body is None:
+                    content, cacheable = compute()
+                    body = json.dumps(content).encode()
+                    if cacheable:
+                        self._responses.put(etag, body)
+            except ServeError as e:
+                span.set(status=e.status.value)
+                return e.status, None, json.dumps({"error": str(e)}).encode(), False
+            span.set(status=http.HTTPStatus.OK.value)
+            return http.HTTPStatus.OK, etag if cacheable else None, body, cacheable  # the etag names the reference, not the source of its text
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server_version = "Bible"
+
+    def _respond(self, path, query):
+        status, etag, body, cacheable = self.server.service.respond(path, query, self.headers.get("If-None-Match"))
+        self.send_response(status)
+        if cacheable:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=86400")
+        else:  # errors and fallback text, which clients must not keep once the ESV API is back
+            self.send_header("Cache-Control", "no-store")
+        if status != http.HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        split_path = urllib.parse.urlsplit(self.path)
+        self._respond(split_path.path, urllib.parse.parse_qs(split_path.query))
+
+    def do_POST(self):  # a batch of references as {"q": [...], "int_reference": [...], "text": true}
+        split_path = urllib.parse.urlsplit(self.path)
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}")
+            query = {key: [str(item) for item in (value if isinstance(value, list) else [value])] for key, value in body.items()}
+        except (AttributeError, ValueError):
+            self.send_error(http.HTTPStatus.BAD_REQUEST, "the request body must be a JSON object")
+            return
+        self._respond(split_path.path, query)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(http.server.HTTPServer):  # handles requests on a bounded pool of worker threads
+    def __init__(self, service, host=_DEFAULT_HOST, port=_DEFAULT_PORT, workers=_DEFAULT_WORKERS):
+        super().__init__((host, port), _Handler)
+        self._service = service
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bible-serve")
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    @property
+    def service(self):
+        return self._service
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bible.serve", description="Serve passages, search and characters as JSON.")
+    parser.add_argument("--cache-size", type=int, default=_DEFAULT_CACHE_SIZE,
+                        help=f"the number of responses to cache (default: {_DEFAULT_CACHE_SIZE})")
+    parser.add_argument("--fallback-text", help="a corpus file (see Translation.dump_text) to serve text from when the ESV API is unavailable")
+    parser.add_argument("--host", default=_DEFAULT_HOST, help=f"(default: {_DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=_DEFAULT_PORT, help=f"(default: {_DEFAULT_PORT})")
+    parser.add_argument("--snapshot", help="attach to this snapshot (see bible.snapshot) rather than loading the translation")
+    parser.add_argument("--workers", type=int, default=_DEFAULT_WORKERS,
+                        help=f"the number of requests handled at once (default: {_DEFAULT_WORKERS})")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    translation = snapshot.attach(args.snapshot) if args.snapshot is not None else bible.esv()
+    fallback_corpus = corpus.Corpus(args.fallback_text) if args.fallback_text is not None else None
+    server = Server(Service(translation, fallback_corpus, args.cache_size), args.host, args.port, args.workers)
+    print(f"serving on {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import array
+import dataclasses
+import functools
+import importlib
+import json
+import mmap
+import struct
+
+from bible import cache, utils
+
+
+_ALIGNMENT = array.array("I").itemsize
+_HEADER = struct.Struct("=8sII")  # magic, version, length of the JSON metadata (native byte order, like the tables)
+_MAGIC = b"BIBLESNP"
+_TABLES = ("int_references", "index_starts", "index_ends", "index_values")
+_VERSION = 1
+_YEAR_ATTRIBUTES = ("age", "born", "died")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _class_path(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _import_class(class_path):
+    module_name, _, qualname = class_path.partition(":")
+    return functools.reduce(getattr, qualname.split("."), importlib.import_module(module_name))
+
+
+def _book_data(book):
+    return {"number": book.number, "name": book.name, "alt_names": list(book.alt_names), "author": book.author,
+            "categories": list(book.categories), "language": book.language}
+
+
+def _character_data(character):
+    character_data = {}
+    for field in dataclasses.fields(character):
+        value = getattr(character, field.name)
+        if field.name == "translation" or value is utils.UNKNOWN:
+            continue
+        if field.name == "passages":
+            value = [(passage.verse_start.ordinal, passage.verse_end.ordinal) for passage in value]
+        elif field.name in _YEAR_ATTRIBUTES:
+            value = int(value)
+        character_data[field.name] = value
+    return character_data
+
+
+def _passage(translation, ordinal_start, ordinal_end):
+    verse_start = translation._verses[ordinal_start]
+    verse_end = translation._verses[ordinal_end]
+    return translation.Passage(verse_start.book, verse_start.chapter, verse_start, verse_end.book, verse_end.chapter, verse_end)
+
+
+def attach(file_path):
+    with open(file_path, "rb") as f:
+        snapshot_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, metadata_length = _HEADER.unpack_from(snapshot_mmap)
+    if magic != _MAGIC or version != _VERSION:
+        snapshot_mmap.close()
+        raise SnapshotError(f"{file_path} is not a version {_VERSION} snapshot file")
+    metadata = json.loads(snapshot_mmap[_HEADER.size:_HEADER.size + metadata_length])
+    view = memoryview(snapshot_mmap)
+    tables = {}
+    position = -(-(_HEADER.size + metadata_length) // _ALIGNMENT) * _ALIGNMENT
+    for table in _TABLES:  # the memoryviews keep the mmap open and are shared by every process that attaches
+        size = metadata["tables"][table] * _ALIGNMENT
+        tables[table] = view[position:position + size].cast("I")
+        position += size
+    classes = {name: _import_class(class_path) for name, class_path in metadata["classes"].items()}
+    translation = classes["translation"](name=metadata["name"], passage_cls=classes["passage"], character_cls=classes["character"])
+    books = {book_data.pop("number"): book_data for book_data in metadata["books"]}
+    book = chapter = None
+    for int_reference in tables["int_references"]:
+        book_number, chapter_number, verse_number = int_reference // 1000000, int_reference // 1000 % 1000, int_reference % 1000
+        if book is None or book.number != book_number:
+            book = classes["book"](number=book_number, translation=translation, **books[book_number])
+        if chapter is None or chapter.book is not book or chapter.number != chapter_number:
+            chapter = classes["chapter"](number=chapter_number, book=book)
+        classes["verse"](number=verse_number, chapter=chapter)
+    for character_data in metadata["characters"]:
+        character_data["passages"] = tuple(_passage(translation, *ordinals) for ordinals in character_data.get("passages", ()))
+        character_data["aliases"] = tuple(character_data.get("aliases", ()))
+        character_data["_spouses"] = tuple(character_data.get("_spouses", ()))
+        for attribute in _YEAR_ATTRIBUTES:
+            if attribute in character_data:
+                character_data[attribute] = utils.Year(character_data[attribute])
+        classes["character"](translation=translation, **character_data)
+    translation._freeze(utils.IntervalIndex(tables["index_starts"], tables["index_ends"], tables["index_values"]))
+    if metadata["text_file_path"] is not None:
+        translation.load_text(metadata["text_file_path"])
+    return translation
+
+
+def write(file_path, translation, text_file_path=None):
+    character_index = translation._character_index
+    tables = {
+        "int_references": translation._layout.int_references,
+        "index_starts": array.array("I", character_index.starts),
+        "index_ends": array.array("I", character_index.ends),
+        "index_values": array.array("I", character_index.values)
+    }
+    first_verse = translation._verses[0]
+    metadata = {
+        "name": translation.name,
+        "classes": {
+            "translation": _class_path(type(translation)),
+            "book": _class_path(type(first_verse.book)),
+            "chapter": _class_path(type(first_verse.chapter)),
+            "verse": _class_path(type(first_verse)),
+            "passage": _class_path(translation.Passage),
+            "character": _class_path(translation.Character)
+        },
+        "books": [_book_data(book) for book in translation.books()],
+        "characters": [_character_data(character) for character in translation.characters()],
+        "tables": {table: len(tables[table]) for table in _TABLES},
+        "text_file_path": text_file_path
+    }
+    encoded_metadata = json.dumps(metadata).encode()
+    content = bytearray(_HEADER.pack(_MAGIC, _VERSION, len(encoded_metadata)))
+    content += encoded_metadata
+    content += bytes(-len(content) % _ALIGNMENT)
+    for table in _TABLES:
+        content += tables[table].tobytes()
+    cache.atomic_write(file_path, bytes(content))
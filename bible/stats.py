@@ -0,0 +1,104 @@
+import collections
+
+from bible import corpus, utils
+from bible.translations.esv import api as esv_api
+
+
+_FIELDS = ("words", "characters", "footnotes")
+
+Summary = collections.namedtuple("Summary", ("verses", "words", "characters", "footnotes", "vocabulary", "mean_words", "max_words"))
+
+
+class TextStatistics:  # counts per verse ordinal, built once from a text corpus and reduced with numpy
+    def __init__(self, translation, counts, word_offsets, token_ids, words):
+        self._translation = translation
+        self._counts = counts
+        self._word_offsets = word_offsets
+        self._token_ids = token_ids
+        self._words = words
+        self._numpy = utils.import_optional("numpy", "numpy")
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(translation={self._translation.name}, vocabulary={len(self._words)})"
+
+    @classmethod
+    def build(cls, translation, text_corpus=None):
+        numpy = utils.import_optional("numpy", "numpy")
+        text_corpus = text_corpus or translation._corpus
+        if text_corpus is None:
+            raise ValueError("a text corpus is required; call translation.load_text() (or pass a corpus.Corpus) first")
+        if isinstance(text_corpus, str):
+            text_corpus = corpus.Corpus(text_corpus)
+        counts = {field: numpy.zeros(len(translation._verses), dtype=numpy.int64) for field in _FIELDS}
+        token_ids = []
+        word_ids = {}
+        for ordinal in range(len(translation._verses)):
+            text = esv_api.ESVText.from_parts(*text_corpus[ordinal])
+            body = utils.strip_markers(text.body or "")
+            words = utils.tokenize(body.lower())
+            counts["words"][ordinal] = len(words)
+            counts["characters"][ordinal] = len(body)
+            counts["footnotes"][ordinal] = len(text.footnotes)
+            token_ids.extend(word_ids.setdefault(word, len(word_ids)) for word in words)
+        word_offsets = numpy.concatenate(([0], numpy.cumsum(counts["words"])))
+        return cls(translation, counts, word_offsets, numpy.array(token_ids, dtype=numpy.int32), tuple(word_ids))
+
+    @staticmethod
+    def _book_range(book):
+        return book.first().first().ordinal, book.last().last().ordinal
+
+    def _summary(self, ordinal_ranges):  # inclusive (start, end) ordinal ranges
+        numpy = self._numpy
+        indexes = numpy.concatenate([numpy.arange(start, end + 1) for start, end in ordinal_ranges])
+        words = self._counts["words"][indexes]
+        return Summary(
+            verses=len(indexes),
+            words=int(words.sum()),
+            characters=int(self._counts["characters"][indexes].sum()),
+            footnotes=int(self._counts["footnotes"][indexes].sum()),
+            vocabulary=int(numpy.unique(self._tokens(ordinal_ranges)).size),
+            mean_words=float(words.mean()) if len(words) else 0.0,
+            max_words=int(words.max()) if len(words) else 0
+        )
+
+    def _tokens(self, ordinal_ranges):
+        return self._numpy.concatenate([self._token_ids[self._word_offsets[start]:self._word_offsets[end + 1]] for start, end in ordinal_ranges])
+
+    @property
+    def translation(self):
+        return self._translation
+
+    def book(self, book):
+        return self._summary([self._book_range(book)])
+
+    def category(self, category):
+        return self._summary([self._book_range(book) for book in self._translation.categories[category]])
+
+    def chapter(self, chapter):
+        return self._summary([(chapter.first().ordinal, chapter.last().ordinal)])
+
+    def most_common(self, n=10, passage=None):
+        tokens = self._tokens([(passage.verse_start.ordinal, passage.verse_end.ordinal)]) if passage is not None else self._token_ids
+        frequencies = self._numpy.bincount(tokens, minlength=len(self._words))
+        top = self._numpy.argsort(frequencies, kind="stable")[::-1][:n]
+        return [(self._words[token_id], int(frequencies[token_id])) for token_id in top if frequencies[token_id]]
+
+    def passage(self, passage):
+        return self._summary([(passage.verse_start.ordinal, passage.verse_end.ordinal)])
+
+    def per_book(self, field="words"):
+        books = list(self._translation.books())
+        totals = self._numpy.add.reduceat(self._counts[field], [self._book_range(book)[0] for book in books])
+        return {book.name: int(total) for book, total in zip(books, totals)}
+
+    def per_chapter(self, book, field="words"):
+        chapters = list(book.chapters())
+        start, end = self._book_range(book)
+        totals = self._numpy.add.reduceat(self._counts[field][start:end + 1], [chapter.first().ordinal - start for chapter in chapters])
+        return {chapter.number: int(total) for chapter, total in zip(chapters, totals)}
+
+    def total(self):
+        return self._summary([(0, len(self._translation._verses) - 1)])
+
+    def verse_counts(self, field="words"):  # the per ordinal array itself, for further analysis
+        return self._counts[field]
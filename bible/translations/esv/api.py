@@ -1,26 +1,46 @@
+import concurrent.futures
+import functools
 import itertools
 import os
 import re
+import sys
 
-import requests
-import vlc
-
-from bible import api
+from bible import api, cache, concordance, corpus, metrics, utils
 
 
 # ENVIRONMENT VARIABLES
 _ESV_API_TOKEN_ENV_VAR = "ESV_API_TOKEN"
+_ESV_API_URL_ENV_VAR = "ESV_API_URL"
+_ESV_AUDIO_CACHE_MAX_BYTES_ENV_VAR = "ESV_AUDIO_CACHE_MAX_BYTES"
+_ESV_TEXT_CACHE_MAX_BYTES_ENV_VAR = "ESV_TEXT_CACHE_MAX_BYTES"
 
 
 # INTERNALS
-_AUDIO_CACHE_FILE_PATH_TEMPLATE = "/tmp/bible/{file_name}.mp3"
+_AUDIO_CACHE_DIRECTORY = "/tmp/bible"
+_AUDIO_OFFSETS_FILE_NAME = "offsets.json"
+_DEFAULT_AUDIO_CACHE_MAX_BYTES = 512 * 1024 ** 2
 _DEFAULT_PAGE_SIZE = 100
+_DEFAULT_TEXT_CACHE_MAX_BYTES = 64 * 1024 ** 2  # comfortably more than the whole bible
+_FIRST_TEXT_CHUNK_SIZE = 25  # streamed text starts with a small query so the first verses arrive quickly; later queries double up to the maximum
+_MAX_AUDIO_DOWNLOAD_WORKERS = 4
+_AUDIO_DOWNLOADS = cache.SingleFlight()
 
 
 class ESVError(Exception):
     pass
 
 
+@utils.once
+def _audio_cache():  # created lazily so that environment variables loaded after import are respected
+    max_bytes = int(os.getenv(_ESV_AUDIO_CACHE_MAX_BYTES_ENV_VAR, _DEFAULT_AUDIO_CACHE_MAX_BYTES))
+    return cache.FileCache(_AUDIO_CACHE_DIRECTORY, max_bytes=max_bytes, extension=".mp3")
+
+
+@utils.once
+def _audio_offsets():
+    return cache.JSONStore(os.path.join(_AUDIO_CACHE_DIRECTORY, _AUDIO_OFFSETS_FILE_NAME))
+
+
 class ESVAPIMixin:
     _BASE_URL = "https://api.esv.org/v3/passage/"
     _GET_AUDIO_ENDPOINT_TEMPLATE = "audio/?q={query}"
@@ -34,7 +54,6 @@ class ESVAPIMixin:
     _MAX_VERSES_PER_TEXT_QUERY = 400
 
     def __init__(self, *args, **kwargs):
-        self._text = None
         self._api_token = kwargs.pop("api_token", None)
         super().__init__(*args, **kwargs)
 
@@ -44,19 +63,62 @@ class ESVAPIMixin:
         for first in iterator:
             yield itertools.chain([first], itertools.islice(iterator, size - 1))
 
+    @staticmethod
+    def _range_reference(verses):
+        return f"{verses[0].int_reference} - {verses[-1].int_reference}"
+
+    @staticmethod
+    def _play(*audio_file_paths):
+        vlc = utils.import_optional("vlc", "audio")
+        if len(audio_file_paths) == 1:
+            vlc.MediaPlayer(audio_file_paths[0]).play()
+            return
+        player = vlc.MediaListPlayer()
+        player.set_media_list(vlc.MediaList(audio_file_paths))
+        player.play()
+
     def _audio(self, reference):
-        audio_file_path = _AUDIO_CACHE_FILE_PATH_TEMPLATE.format(file_name=reference)
-        if not os.path.isfile(audio_file_path):
-            os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
-            with open(audio_file_path, "wb") as f:
-                f.write(self._get_bytes(self._GET_AUDIO_ENDPOINT_TEMPLATE.format(query=reference)))
-        vlc.MediaPlayer(audio_file_path).play()
+        self._play(self._audio_file_path(reference))
+
+    def _audio_file_path(self, reference):
+        audio_file_path = _audio_cache().get(reference)
+        metrics.count("cache.miss" if audio_file_path is None else "cache.hit", cache="audio")
+        if audio_file_path is None:
+            audio_file_path = _AUDIO_DOWNLOADS.do(reference, functools.partial(self._download_audio, reference))
+        return audio_file_path
+
+    def _download_audio(self, reference):
+        audio_cache = _audio_cache()
+        # another caller may have finished the download between our cache miss and claiming the flight
+        return audio_cache.get(reference) or audio_cache.put(reference, self._get_bytes(self._GET_AUDIO_ENDPOINT_TEMPLATE.format(query=reference)))
+
+    def _play_cached_segment(self, verse_start, verse_end):
+        chapter = verse_start.chapter
+        chapter_reference = self._range_reference((chapter.first(), chapter.last()))
+        offsets = _audio_offsets().get(chapter_reference)
+        if offsets is None:
+            return False
+        audio_file_path = _audio_cache().get(chapter_reference)
+        if audio_file_path is None:
+            return False
+        vlc = utils.import_optional("vlc", "audio")
+        media = vlc.Media(audio_file_path)
+        media.add_option(f"start-time={offsets[verse_start.number - 1]:.3f}")
+        media.add_option(f"stop-time={offsets[verse_end.number]:.3f}")
+        player = vlc.MediaPlayer()
+        player.set_media(media)
+        player.play()
+        return True
 
     def _get(self, endpoint_uri):
         token = os.getenv(_ESV_API_TOKEN_ENV_VAR)
         if token is None:
             raise ESVError(f"the environment variable, {_ESV_API_TOKEN_ENV_VAR} is not set")
-        response = requests.get(self._BASE_URL + endpoint_uri, headers={"Authorization": f"Token {token}"})
+        import requests  # deferred until something is actually fetched
+        with metrics.span("esv.http", endpoint=endpoint_uri.split("/", 1)[0]) as span:
+            response = requests.get(os.getenv(_ESV_API_URL_ENV_VAR, self._BASE_URL) + endpoint_uri, headers={"Authorization": f"Token {token}"})
+            span.set(status=response.status_code)
+        metrics.count("esv.http.requests", endpoint=endpoint_uri.split("/", 1)[0], status=response.status_code)
         if not response.ok:
             response.raise_for_status()
         return response
@@ -68,46 +130,81 @@ class ESVAPIMixin:
         return self._get(endpoint_uri).json()
 
     def audio(self):
-        self._audio(self.int_reference)
+        verses = list(self.verses())
+        if verses[0].chapter is verses[-1].chapter and self._play_cached_segment(verses[0], verses[-1]):
+            return
+        if len(verses) <= self._MAX_VERSES_PER_AUDIO_QUERY:
+            self._audio(self._range_reference(verses))
+            return
+        references = [self._range_reference(verse_chunk) for verse_chunk in map(list, self._chunk(verses, self._MAX_VERSES_PER_AUDIO_QUERY))]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_MAX_AUDIO_DOWNLOAD_WORKERS) as executor:
+            self._play(*executor.map(self._audio_file_path, references))
+
+    def iter_text(self):  # the body of each verse in order, as soon as the query holding it returns
+        for text in self.translation.iter_texts(self.verses()):
+            yield text.body
 
     def text(self):
-        textless_verses = [verse for verse in self.verses() if verse._text is None]
-        for chunk_index, verse_chunk in enumerate(self._chunk(textless_verses, self._MAX_VERSES_PER_TEXT_QUERY)):
-            query = ",".join(verse.int_reference for verse in verse_chunk)
-            passages = self._get_json(self._GET_TEXT_ENDPOINT_TEMPLATE.format(reference=query))["passages"]
-            for verse_index, passage in enumerate(passages):
-                verse = textless_verses[(chunk_index * self._MAX_VERSES_PER_TEXT_QUERY) + verse_index]
-                verse._text = ESVText(passage, verse.chapter.number if verse.number == 1 else None)
-        return " ".join(verse.text().body for verse in self.verses())
+        text_corpus = self.translation._corpus
+        if text_corpus is not None:
+            return " ".join(text_corpus.body(verse.ordinal) for verse in self.verses())
+        return " ".join(text.body for text in self.translation.texts(list(self.verses())))
 
 
 class ESVText:
-    _TEXT_REGEX = re.compile(r"^(?P<title>.+?)?(?P<body>\[\d+\].+?)(?:Footnotes(?P<footnotes>.+))?$")
     _FOOTNOTES_REGEX = re.compile(r"\((\d+)\) \d+:\d+ (.+?)(?=\(\d+\) |$)")
+    _FOOTNOTES_SEPARATOR = "Footnotes"
+    _VERSE_NUMBER_REGEX = re.compile(r"\[\d+\].")
 
     def __init__(self, raw_text, chapter=None):
         self._raw_text = raw_text
-        match = self._TEXT_REGEX.match(raw_text.replace("\n", ""))
+        text = raw_text.replace("\n", "") if "\n" in raw_text else raw_text
+        # a title, where present, is everything before the first verse number that has at least one character before it
+        match = self._VERSE_NUMBER_REGEX.search(text, 1) or self._VERSE_NUMBER_REGEX.match(text)
         if match is None:
             raise ESVError("the raw_text from the response did not match the expected pattern")
-        groups = match.groupdict()
-        self._title = groups["title"]
-        self._body = (f"{{{chapter}}}" if chapter else '') + groups["body"]
-        footnotes = groups["footnotes"]
-        self._footnotes = dict(self._FOOTNOTES_REGEX.findall(footnotes)) if footnotes is not None else {}
+        body_start = match.start()
+        footnotes_start = text.find(self._FOOTNOTES_SEPARATOR, match.end())
+        if footnotes_start + len(self._FOOTNOTES_SEPARATOR) == len(text):  # an empty footnotes section belongs to the body
+            footnotes_start = -1
+        body_end = footnotes_start if footnotes_start != -1 else len(text)
+        self._title = text[:body_start] or None
+        self._body = (f"{{{chapter}}}" if chapter else '') + text[body_start:body_end]
+        self._footnotes_text = text[body_end + len(self._FOOTNOTES_SEPARATOR):] if footnotes_start != -1 else None
+        self._footnotes = None
+        self._length = None
+
+    @classmethod
+    def from_parts(cls, title, body, footnotes_text):
+        text = cls.__new__(cls)
+        text._raw_text = None
+        text._title = title
+        text._body = body
+        text._footnotes_text = footnotes_text
+        text._footnotes = None
+        text._length = None
+        return text
 
     def __len__(self):
-        return len(self._body.split())
+        if self._length is None:
+            self._length = len(self._body.split())
+        return self._length
 
     def __repr__(self):
         return self._body
 
+    def __sizeof__(self):  # includes the strings, so text caches can be bounded by bytes
+        return super().__sizeof__() + sum(sys.getsizeof(value) for value in (self._raw_text, self._title, self._body, self._footnotes_text)
+                                          if value is not None)
+
     @property
     def body(self):
         return self._body
 
     @property
     def footnotes(self):
+        if self._footnotes is None:
+            self._footnotes = dict(self._FOOTNOTES_REGEX.findall(self._footnotes_text)) if self._footnotes_text is not None else {}
         return self._footnotes
 
     @property
@@ -116,14 +213,60 @@ class ESVText:
 
 
 class Verse(ESVAPIMixin, api.Verse):
+    def audio(self):
+        if not self._play_cached_segment(self, self):
+            self._audio(self.int_reference)
+
+    def iter_text(self):
+        yield self.text().body
+
     def text(self):
-        if self._text is None:
-            self._text = ESVText(self._get_json(self._GET_TEXT_ENDPOINT_TEMPLATE.format(reference=str(self)))["passages"][0])
-        return self._text
+        text = self._translation._text_cache.get(self.ordinal)
+        metrics.count("cache.miss" if text is None else "cache.hit", cache="text")
+        read_ahead = self._translation._read_ahead
+        if read_ahead is not None:  # hits are recorded too; reading prefetched verses is what keeps a run going
+            read_ahead.record(self.ordinal)
+        if text is None:
+            text_corpus = self._translation._corpus
+            if text_corpus is not None:  # read from the shared corpus rather than caching a private copy
+                return ESVText.from_parts(*text_corpus[self.ordinal])
+            text_batcher = self._translation._text_batcher
+            if text_batcher is not None:  # joins the verses other callers are requesting into one query
+                return text_batcher.submit(self).result()
+            text = self._fetch_shared_text()
+        return text
+
+    def _fetch_text(self):
+        text = self._translation._text_cache.peek(self.ordinal)
+        if text is None:  # another caller may have finished fetching between our check and claiming the fetch
+            text = ESVText(self._get_json(self._GET_TEXT_ENDPOINT_TEMPLATE.format(reference=str(self)))["passages"][0])
+            self._translation._cache_text(self, text)
+        return text
+
+    def _fetch_shared_text(self):  # never through the micro-batcher, whose workers call this from texts()
+        text = self._translation._text_fetches.do(self, self._fetch_text)
+        if text is None:  # the multi-verse fetch we waited on did not return this verse
+            text = self._fetch_text()
+        return text
 
 
 class Chapter(ESVAPIMixin, api.Chapter):
-    pass
+    def index_audio(self):
+        verses = list(self.verses())
+        references = [self._range_reference(verses), *(verse.int_reference for verse in verses)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_MAX_AUDIO_DOWNLOAD_WORKERS) as executor:
+            audio_file_paths = list(executor.map(self._audio_file_path, references))
+        durations = []
+        for audio_file_path in audio_file_paths:
+            with open(audio_file_path, "rb") as f:
+                durations.append(utils.mp3_duration(f.read()))
+        chapter_duration, *verse_durations = durations
+        # verse clips carry their own lead-in so scale them to fit the chapter recording
+        scale = chapter_duration / sum(verse_durations) if sum(verse_durations) else 0
+        offsets = list(itertools.accumulate((verse_duration * scale for verse_duration in verse_durations), initial=0))
+        offsets[-1] = chapter_duration
+        _audio_offsets().set(references[0], offsets)
+        return offsets
 
 
 class Book(ESVAPIMixin, api.Book):
@@ -131,9 +274,132 @@ class Book(ESVAPIMixin, api.Book):
 
 
 class Translation(ESVAPIMixin, api.Translation):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._corpus = None
+        self._concordance = None
+        self._read_ahead = None
+        self._text_batcher = None
+        self._text_cache = cache.BoundedCache(max_bytes=int(os.getenv(_ESV_TEXT_CACHE_MAX_BYTES_ENV_VAR, _DEFAULT_TEXT_CACHE_MAX_BYTES)))
+        self._text_fetches = cache.SingleFlight()
+
+    def _cache_text(self, verse, text):
+        self._text_cache.put(verse.ordinal, text)
+        if self._concordance is not None:
+            self._concordance.add(verse.ordinal, text.body or "")
+        return text
+
+    def _fetch_texts(self, verses):  # texts() for those who have already looked up the verses (or are prefetching them)
+        if self._corpus is not None:
+            return [ESVText.from_parts(*self._corpus[verse.ordinal]) for verse in verses]
+        texts = {}  # held here as well as in the text cache, which may evict some of them before we return
+        for verse in verses:
+            text = self._text_cache.peek(verse.ordinal)
+            if text is not None:
+                texts[verse] = text
+        textless_verses = [verse for verse in dict.fromkeys(verses) if verse not in texts]
+        text_fetches = self._text_fetches
+        claimed, in_flight = text_fetches.claim(textless_verses)
+        for verse in list(claimed):
+            text = self._text_cache.peek(verse.ordinal)
+            if text is not None:  # fetched by another caller since we checked
+                texts[verse] = text
+                text_fetches.resolve(verse, text)
+                del claimed[verse]
+        textless_verses = list(claimed)
+        try:
+            for chunk_index, verse_chunk in enumerate(self._chunk(textless_verses, self._MAX_VERSES_PER_TEXT_QUERY)):
+                query = ",".join(verse.int_reference for verse in verse_chunk)
+                passages = self._get_json(self._GET_TEXT_ENDPOINT_TEMPLATE.format(reference=query))["passages"]
+                for verse_index, passage in enumerate(passages):
+                    verse = textless_verses[(chunk_index * self._MAX_VERSES_PER_TEXT_QUERY) + verse_index]
+                    texts[verse] = self._cache_text(verse, ESVText(passage, verse.chapter.number if verse.number == 1 else None))
+                    text_fetches.resolve(verse, texts[verse])
+                    del claimed[verse]
+        finally:
+            for verse in claimed:  # unresolved because of an error (or a short response); waiting callers will fetch them individually
+                text_fetches.resolve(verse)
+        concurrent.futures.wait(in_flight.values())
+        for verse, future in in_flight.items():
+            if future.exception() is None and future.result() is not None:
+                texts[verse] = future.result()
+        return [texts[verse] if verse in texts else verse._fetch_shared_text() for verse in verses]
+
+    def _prefetch_text(self, ordinals):
+        self._fetch_texts([self._verses[ordinal] for ordinal in ordinals])
+
+    @property
+    def text_cache(self):
+        return self._text_cache
+
     def audio(self):
         raise NotImplementedError()
 
+    def concordance(self, file_path=None):  # created (or loaded) on first use and then kept up to date as verse text is fetched
+        if self._concordance is None:
+            self._concordance = concordance.Concordance.load(file_path, self) if file_path is not None else concordance.Concordance(self)
+            if self._corpus is not None:
+                for ordinal in range(len(self._verses)):
+                    self._concordance.add(ordinal, self._corpus.body(ordinal) or "")
+            else:
+                for ordinal, text in self._text_cache.items():
+                    self._concordance.add(ordinal, text.body or "")
+        return self._concordance
+
+    def configure_text_cache(self, max_entries=None, max_bytes=None, policy="lru", weak=False):  # keeps as much of the current cache as fits
+        text_cache = cache.BoundedCache(max_entries, max_bytes, policy, weak)
+        for ordinal, text in self._text_cache.items():
+            text_cache.put(ordinal, text)
+        self._text_cache = text_cache
+        return text_cache
+
+    def dump_text(self, file_path):
+        texts = self.iter_texts(self._verses)  # streamed, so a bounded text cache never has to hold every verse
+        corpus.write(file_path, ((text.title, text.body, text._footnotes_text) for text in texts))
+
+    def index_mentions(self, texts=None, workers=None):  # defaults to the loaded corpus, or else the text of every verse fetched so far
+        if texts is None:
+            texts = self._corpus
+            if texts is None:
+                texts = {ordinal: text.body for ordinal, text in self._text_cache.items()}
+        return super().index_mentions(texts, workers)
+
+    def iter_text(self):
+        raise NotImplementedError()
+
+    def iter_texts(self, verses):  # like texts() but streamed; at most one query's worth of text is held at a time
+        verses = iter(verses)
+        chunk_size = _FIRST_TEXT_CHUNK_SIZE
+        verse_chunk = list(itertools.islice(verses, chunk_size))
+        while verse_chunk:
+            yield from self.texts(verse_chunk)
+            chunk_size = min(chunk_size * 2, self._MAX_VERSES_PER_TEXT_QUERY)
+            verse_chunk = list(itertools.islice(verses, chunk_size))
+
+    def load_text(self, file_path):
+        text_corpus = corpus.Corpus(file_path)
+        if len(text_corpus) != len(self._verses):
+            text_corpus.close()
+            raise ESVError(f"the corpus, {file_path} holds {len(text_corpus)} verses but this translation has {len(self._verses)}")
+        self._corpus = text_corpus
+
+    def micro_batch(self, enabled=True, delay=0.005, max_size=None):  # opt in to batching the single verse text requests of concurrent callers
+        if self._text_batcher is not None:
+            self._text_batcher.close()
+            self._text_batcher = None
+        if enabled:
+            self._text_batcher = cache.MicroBatcher(self._fetch_texts, max_size or self._MAX_VERSES_PER_TEXT_QUERY, delay)
+        return self._text_batcher
+
+    def read_ahead(self, enabled=True, min_window=8, max_window=None):  # opt in to prefetching text while verses are read in sequence
+        if self._read_ahead is not None:
+            self._read_ahead.close()
+            self._read_ahead = None
+        if enabled:
+            max_window = max_window or self._MAX_VERSES_PER_TEXT_QUERY
+            self._read_ahead = cache.ReadAhead(self._prefetch_text, len(self._verses), min_window, max_window)
+        return self._read_ahead
+
     def search(self, query):
         page = 1
         while page is not None:
@@ -147,14 +413,20 @@ class Translation(ESVAPIMixin, api.Translation):
                 else:
                     chapter_number, verse_number = chapter_verse_split
                 verse = self[book][int(chapter_number)][int(verse_number)]
-                verse._text = ESVText(result["content"])
+                self._cache_text(verse, ESVText(result["content"]))
                 yield verse
             page = page + 1 if page != response["total_pages"] else None
 
     def text(self):
         raise NotImplementedError()
 
+    def texts(self, verses):  # the text of many verses (not necessarily contiguous) in as few queries as possible
+        if self._corpus is None:  # only callers' lookups count towards the statistics and eviction order of the text cache
+            hits = sum(self._text_cache.get(verse.ordinal) is not None for verse in verses)
+            metrics.count("cache.hit", hits, cache="text")
+            metrics.count("cache.miss", len(verses) - hits, cache="text")
+        return self._fetch_texts(verses)
+
 
 class Passage(ESVAPIMixin, api.Passage):
-    def audio(self):
-        self._audio(self.int_reference)
+    pass
@@ -1,22 +1,33 @@
+import array
+import bisect
 import collections
 import dataclasses
 import enum
+import functools
 import glob
+import importlib
 import inspect
 import itertools
 import json
 import operator
 import os
+import re
 import sys
+import threading
+import weakref
 
-from fuzzywuzzy import fuzz
-import jsonmerge
-import num2words
-
-from bible import enums
+from bible import enums, metrics
 
 
 DEFAULT_THRESHOLD = 60
+_MARKER_REGEX = re.compile(r"\{\d+\}|\[\d+\]|\(\d+\)")  # chapter numbers, verse numbers and footnote references within text
+_MP3_BITRATES = {  # kbps by bitrate index, for layer III
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG 1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),  # MPEG 2
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)  # MPEG 2.5
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_WORD_REGEX = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
 
 
 class Unknown:
@@ -174,6 +185,7 @@ class FamilyTreeMixin:
         return lowest_common_ancestors  # [[common_ancestors], is_half, is_maternal_relation, my_distance, other_distance]
 
     def relation(self, other):  # Doesn't support identical twins
+        import num2words  # deferred along with other dependencies that not every caller needs
         connection_template = {"type": None, "relatedness": None, "lowest_common_ancestors": None}
         connections = []
         blood_relations = {"connections": connections, "total_relatedness": None}
@@ -222,6 +234,8 @@ class FamilyTreeMixin:
 class Filterable:
     def __init__(self, iterable, dataclass=None, field=None):
         self._iterable = iterable
+        self._items = None
+        self._lock = threading.Lock()
         self._dataclass = dataclass
         self._fields = self._inspect_fields(self._dataclass)
         self.field = field
@@ -249,14 +263,18 @@ class Filterable:
     def __getattr__(self, name):
         if self._dataclass is not None and name not in self._fields:
             raise AttributeError(f"{name(self._dataclass)!r} object has no attribute {name!r}")
-        return type(self)(self._iterable, self._dataclass, name)
+        return type(self)(self, self._dataclass, name)
 
     def __gt__(self, value):
         return type(self)(self._filter(operator.gt, value), self._dataclass, self._field)
 
     def __iter__(self):
-        self._iterable, iterable_copy = itertools.tee(self._iterable)
-        return iterable_copy
+        if self._items is None:  # materialise once so that many threads can iterate the same object
+            with self._lock:
+                if self._items is None:
+                    self._items = tuple(self._iterable)
+                    self._iterable = None
+        return iter(self._items)
 
     def __le__(self, value):
         return type(self)(self._filter(operator.le, value), self._dataclass, self._field)
@@ -436,6 +454,83 @@ class FuzzyDict(dict):
         return (matched, closest_key, self.get(closest_key), closest_ratio)
 
 
+class IntervalIndex:  # closed intervals sorted by start; the tables can be arrays or memoryviews over a snapshot
+    def __init__(self, starts, ends, values):
+        self._starts = starts
+        self._ends = ends
+        self._values = values
+
+    def __len__(self):
+        return len(self._starts)
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        columns = tuple(zip(*sorted(intervals))) or ((), (), ())
+        return cls(*(array.array("I", column) for column in columns))
+
+    @property
+    def ends(self):
+        return self._ends
+
+    @property
+    def starts(self):
+        return self._starts
+
+    @property
+    def values(self):
+        return self._values
+
+    def overlapping(self, start, end):
+        stop = bisect.bisect_right(self._starts, end)
+        return {self._values[index] for index in range(stop) if self._ends[index] >= start}
+
+
+class Layout:  # the int_reference of every verse by ordinal; one instance is shared by every translation with the same layout
+    _interned = weakref.WeakValueDictionary()
+    _lock = threading.Lock()
+
+    def __init__(self, int_references):
+        self._int_references = int_references
+
+    def __len__(self):
+        return len(self._int_references)
+
+    @classmethod
+    def intern(cls, int_references):
+        key = int_references.tobytes()
+        with cls._lock:
+            layout = cls._interned.get(key)
+            if layout is None:
+                layout = cls._interned[key] = cls(int_references)
+        return layout
+
+    @property
+    def int_references(self):
+        return self._int_references
+
+    def ordinal(self, int_reference):
+        index = bisect.bisect_left(self._int_references, int_reference)
+        if index < len(self._int_references) and self._int_references[index] == int_reference:
+            return index
+        return None
+
+
+class LazyRegex:
+    def __init__(self, pattern, flags=()):  # flags are names, resolved against regex (not re, whose values differ) on first compile
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    def __get__(self, instance, owner):
+        if self._compiled is None:
+            module = importlib.import_module("regex")
+            flags = 0
+            for flag in self.flags:
+                flags |= getattr(module, flag)
+            self._compiled = module.compile(self.pattern, flags=flags)
+        return self._compiled
+
+
 class Year(int):
     def __repr__(self):
         return repr(self.value)
@@ -450,8 +545,12 @@ class Year(int):
         return f"{abs(self)} AD"  # abs() appears extraneous but needed to avoid infinite recursion
 
 
+def clear_data_cache():  # release the parsed data files; translations already loaded do not need them
+    _load_shared_data.cache_clear()
+
+
 def fetch_pattern(cls, group_suffix="_start"):
-    name_pattern = getattr(cls, "_NAME_REGEX").pattern
+    name_pattern = inspect.getattr_static(cls, "_NAME_REGEX").pattern  # avoid compiling a LazyRegex
     if group_suffix is not None:
         name_pattern = name_pattern.replace(">", f"{group_suffix}>")
     return name_pattern[1:-1]
@@ -472,6 +571,28 @@ def find_enum_classes(*modules):
             yield enum_class
 
 
+def once(function):
+    lock = threading.Lock()
+    results = []
+
+    @functools.wraps(function)
+    def wrapper():
+        if not results:
+            with lock:
+                if not results:
+                    results.append(function())
+        return results[0]
+    wrapper.cache_clear = results.clear
+    return wrapper
+
+
+def import_optional(module_name, extra):
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"{module_name} is required for this functionality; install the '{extra}' extra, e.g. pip install Bible[{extra}]") from e
+
+
 def int_reference(book_number, chapter_number=1, verse_number=1):
     return f"{book_number:01d}{chapter_number:03d}{verse_number:03d}"
 
@@ -481,44 +602,85 @@ def load_data(file_path, enum_classes):
         return json.load(f, cls=_EnumDecoder, enum_classes=enum_classes)
 
 
+@functools.lru_cache(maxsize=None)
+def _load_shared_data(file_path, enum_classes):  # reused by every load from the file (until clear_data_cache()) so it must never be mutated
+    return load_data(file_path, enum_classes)
+
+
 def load_translation(data_file_path=None, translation_cls=None, book_cls=None, chapter_cls=None, verse_cls=None, passage_cls=None, character_cls=None,
                      enum_classes=()):
     from bible import api  # Avoid circular import
-    enum_classes = enum_classes or tuple(find_enum_classes())
-    data = base_data = load_data(find_data_file_path(), enum_classes=enum_classes)
+    enum_classes = tuple(enum_classes) or tuple(find_enum_classes())
     arbitrary_cls = next(filter(None, (translation_cls, book_cls, chapter_cls, verse_cls, passage_cls, character_cls)), None)
+    with metrics.span("load_translation.phase", phase="load_data"):
+        data = base_data = _load_shared_data(find_data_file_path(), enum_classes)
+        if arbitrary_cls is not None:
+            translation_data = _load_shared_data(data_file_path or find_data_file_path(arbitrary_cls.__module__), enum_classes)
     if arbitrary_cls is not None:
-        data = jsonmerge.merge(base_data, load_data(data_file_path or find_data_file_path(arbitrary_cls.__module__), enum_classes=enum_classes))
+        with metrics.span("load_translation.phase", phase="merge"):
+            data = overlay(base_data, translation_data)
     passage_cls = passage_cls or api.Passage
     character_cls = character_cls or api.Character
-    meta_data = data["meta"]
-    translation = (translation_cls or api.Translation)(name=meta_data.pop("name"), passage_cls=passage_cls, character_cls=character_cls, **meta_data)
-    for book_number, book_data in data.get("books", {}).items():
-        chapters = book_data.pop("chapters", {})
-        book = (book_cls or api.Book)(number=int(book_number), name=book_data.pop("name"), translation=translation, **book_data)
-        for chapter_number, chapter_data in chapters.items():
-            verses = chapter_data.pop("verses", {})
-            chapter = (chapter_cls or api.Chapter)(number=int(chapter_number), book=book, **chapter_data)
-            for verse_number, verse_data in verses.items():
-                _ = (verse_cls or api.Verse)(number=int(verse_number), chapter=chapter, **verse_data)
-    for character_number, character_data in data.get("characters", {}).items():
-        character_data["passages"] = tuple(map(translation.passage, character_data.get("passages", ())))
-        character_data["aliases"] = tuple(character_data.pop("aliases", ()))
-        character_data["_father"] = safe_int(character_data.pop("father", UNKNOWN))
-        character_data["_mother"] = safe_int(character_data.pop("mother", UNKNOWN))
-        character_data["_spouses"] = tuple(map(int, character_data.pop("spouses", ())))
-        for attribute in ("age", "born", "died"):
-            value = character_data.pop(attribute, UNKNOWN)
-            if value is not UNKNOWN:
-                character_data[attribute] = Year(value)
-        _ = character_cls(number=int(character_number), translation=translation, **character_data)
+    meta_data = {key: value for key, value in data["meta"].items() if key != "name"}
+    translation = (translation_cls or api.Translation)(name=data["meta"]["name"], passage_cls=passage_cls, character_cls=character_cls, **meta_data)
+    with metrics.span("load_translation.phase", phase="books"):
+        for book_number, book_data in data.get("books", {}).items():
+            book_kwargs = {key: value for key, value in book_data.items() if key not in ("chapters", "name")}
+            book = (book_cls or api.Book)(number=int(book_number), name=book_data["name"], translation=translation, **book_kwargs)
+            for chapter_number, chapter_data in book_data.get("chapters", {}).items():
+                chapter_kwargs = {key: value for key, value in chapter_data.items() if key != "verses"}
+                chapter = (chapter_cls or api.Chapter)(number=int(chapter_number), book=book, **chapter_kwargs)
+                for verse_number, verse_data in chapter_data.get("verses", {}).items():
+                    _ = (verse_cls or api.Verse)(number=int(verse_number), chapter=chapter, **verse_data)
+    with metrics.span("load_translation.phase", phase="characters"):
+        for character_number, character_data in data.get("characters", {}).items():
+            character_kwargs = {key: value for key, value in character_data.items() if key not in ("father", "mother", "spouses")}
+            character_kwargs["passages"] = tuple(map(translation.passage, character_data.get("passages", ())))
+            character_kwargs["aliases"] = tuple(character_data.get("aliases", ()))
+            character_kwargs["_father"] = safe_int(character_data.get("father", UNKNOWN))
+            character_kwargs["_mother"] = safe_int(character_data.get("mother", UNKNOWN))
+            character_kwargs["_spouses"] = tuple(map(int, character_data.get("spouses", ())))
+            for attribute in ("age", "born", "died"):
+                if attribute in character_data:
+                    character_kwargs[attribute] = Year(character_data[attribute])
+            _ = character_cls(number=int(character_number), translation=translation, **character_kwargs)
+    translation._freeze()
     return translation
 
 
+def mp3_duration(content):
+    duration = 0
+    index = 0
+    if content[:3] == b"ID3":  # skip the ID3v2 tag; its size is a 4 byte syncsafe integer
+        index = 10 + ((content[6] << 21) | (content[7] << 14) | (content[8] << 7) | content[9]) + (10 if content[5] & 0x10 else 0)
+    while index + 4 <= len(content):
+        version = (content[index + 1] >> 3) & 0x3
+        bitrate_index = content[index + 2] >> 4
+        sample_rate_index = (content[index + 2] >> 2) & 0x3
+        if (content[index] != 0xFF or content[index + 1] & 0xE0 != 0xE0 or version == 1 or (content[index + 1] >> 1) & 0x3 != 1 or
+                bitrate_index in (0, 15) or sample_rate_index == 3):
+            index += 1
+            continue
+        sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+        samples = 1152 if version == 3 else 576
+        padding = (content[index + 2] >> 1) & 0x1
+        duration += samples / sample_rate
+        index += (samples // 8) * _MP3_BITRATES[version][bitrate_index] * 1000 // sample_rate + padding
+    return duration
+
+
 def name(obj):
     return obj.__name__
 
 
+def overlay(base, overlay_):  # a recursive merge where overlay_ wins; neither is mutated and untouched base values are shared, not copied
+    merged = dict(base)
+    for key, value in overlay_.items():
+        base_value = merged.get(key)
+        merged[key] = overlay(base_value, value) if isinstance(base_value, dict) and isinstance(value, dict) else value
+    return merged
+
+
 def reference(book_name, chapter_number=None, verse_number=None):
     return f"{book_name}{(f' {chapter_number}') if chapter_number else ''}{(f':{verse_number}') if verse_number else ''}"
 
@@ -529,6 +691,7 @@ def safe_int(value):
 
 
 def safe_ratio(s1, s2):
+    from fuzzywuzzy import fuzz
     ratio = 0
     try:
         ratio = fuzz.ratio(s1, s2)
@@ -544,5 +707,13 @@ def slugify(value):
         return value
 
 
+def strip_markers(text):
+    return _MARKER_REGEX.sub("", text).strip()
+
+
+def tokenize(text):
+    return _WORD_REGEX.findall(strip_markers(text))
+
+
 def unique_value_iterating_dict(d):
     yield from dict.fromkeys(d.values())
@@ -0,0 +1,90 @@
+import array
+import bisect
+
+from bible import utils
+
+
+class VersificationMap:  # maps verse ordinals of one translation to another as runs of consecutive ordinals
+    def __init__(self, source, target, source_starts, target_starts, lengths):
+        self._source = source
+        self._target = target
+        self._source_starts = source_starts
+        self._target_starts = target_starts
+        self._lengths = lengths
+
+    def __len__(self):
+        return len(self._source_starts)
+
+    def __repr__(self):
+        return f"{utils.name(type(self))}(source={self._source.name}, target={self._target.name}, runs={len(self)})"
+
+    @classmethod
+    def build(cls, source, target, overrides=None):  # overrides map source int_references to target int_references (or None if absent)
+        overrides = {int(key): (int(value) if value is not None else None) for key, value in (overrides or {}).items()}
+        if source._layout is target._layout and not overrides:
+            length = len(source._layout)
+            return cls(source, target, array.array("I", (0, )), array.array("I", (0, )), array.array("I", (length, )))
+        source_starts = array.array("I")
+        target_starts = array.array("I")
+        lengths = array.array("I")
+        for source_ordinal, int_reference in enumerate(source._layout.int_references):
+            target_int_reference = overrides.get(int_reference, int_reference)
+            target_ordinal = target._layout.ordinal(target_int_reference) if target_int_reference is not None else None
+            if target_ordinal is None:
+                continue
+            if lengths and source_starts[-1] + lengths[-1] == source_ordinal and target_starts[-1] + lengths[-1] == target_ordinal:
+                lengths[-1] += 1
+            else:
+                source_starts.append(source_ordinal)
+                target_starts.append(target_ordinal)
+                lengths.append(1)
+        return cls(source, target, source_starts, target_starts, lengths)
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def target(self):
+        return self._target
+
+    def convert(self, ordinals):  # many ordinals at once; unmapped ordinals become -1
+        if hasattr(ordinals, "dtype"):  # vectorised for numpy arrays
+            numpy = utils.import_optional("numpy", "numpy")
+            source_starts, target_starts, lengths = (numpy.frombuffer(table, dtype=numpy.uint32).astype(numpy.int64)
+                                                     for table in (self._source_starts, self._target_starts, self._lengths))
+            ordinals = numpy.asarray(ordinals, dtype=numpy.int64)
+            indexes = numpy.searchsorted(source_starts, ordinals, side="right") - 1
+            clipped_indexes = numpy.clip(indexes, 0, None)
+            offsets = ordinals - source_starts[clipped_indexes]
+            mapped = (indexes >= 0) & (offsets < lengths[clipped_indexes])
+            return numpy.where(mapped, target_starts[clipped_indexes] + offsets, -1)
+        return array.array("l", (-1 if target_ordinal is None else target_ordinal for target_ordinal in map(self.ordinal, ordinals)))
+
+    def ordinal(self, source_ordinal):
+        index = bisect.bisect_right(self._source_starts, source_ordinal) - 1
+        if index < 0 or source_ordinal - self._source_starts[index] >= self._lengths[index]:
+            return None
+        return self._target_starts[index] + source_ordinal - self._source_starts[index]
+
+    def passage(self, passage):  # spans every target verse that any verse of the passage maps to
+        start = passage.verse_start.ordinal
+        end = passage.verse_end.ordinal
+        target_ordinals = []
+        for index in range(max(bisect.bisect_right(self._source_starts, start) - 1, 0), bisect.bisect_right(self._source_starts, end)):
+            run_start = max(start, self._source_starts[index])
+            run_end = min(end, self._source_starts[index] + self._lengths[index] - 1)
+            if run_start <= run_end:
+                offset = self._target_starts[index] - self._source_starts[index]
+                target_ordinals.extend((run_start + offset, run_end + offset))
+        if not target_ordinals:
+            raise utils.BibleReferenceError(f"no verse of {passage} exists in {self._target.name}")
+        verse_start = self._target._verses[min(target_ordinals)]
+        verse_end = self._target._verses[max(target_ordinals)]
+        return self._target.Passage(verse_start.book, verse_start.chapter, verse_start, verse_end.book, verse_end.chapter, verse_end)
+
+    def verse(self, verse):
+        target_ordinal = self.ordinal(verse.ordinal)
+        if target_ordinal is None:
+            raise utils.BibleReferenceError(f"{verse} does not exist in {self._target.name}")
+        return self._target._verses[target_ordinal]
@@ -7,13 +7,25 @@ with open("requirements.txt") as f:
 
 setuptools.setup(
     name="Bible",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=("benchmarks", "benchmarks.*", "tests", "tests.*")),
     include_package_data=True,
     install_requires=dependencies,
     extras_require={
+        "audio": [
+            "python-vlc"
+        ],
         "dev": [
             "flake8",
             "pyclean"
+        ],
+        "numpy": [
+            "numpy"
+        ],
+        "parquet": [
+            "pyarrow"
+        ],
+        "tree": [
+            "graphviz"
         ]
     }
 )
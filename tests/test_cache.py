@@ -0,0 +1,203 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from bible import cache
+
+
+class TestFileCache(unittest.TestCase):  # two instances on one directory stand in for two processes
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_evicted_by_another_instance(self):
+        first, second = cache.FileCache(self.directory, max_bytes=150), cache.FileCache(self.directory, max_bytes=150)
+        file_path = first.put("x", bytes(100))
+        self.assertEqual(second.get("x"), file_path)
+        second.put("y", bytes(100))  # over the shared budget, so x is evicted
+        self.assertFalse(os.path.exists(file_path))
+        self.assertIsNone(first.get("x"))
+        self.assertNotIn("x", first)
+        self.assertIsNotNone(first.get("y"))
+
+    def test_entries_of_another_instance_survive(self):
+        first, second = cache.FileCache(self.directory), cache.FileCache(self.directory)
+        first.put("x", b"x")
+        second.put("y", b"y")
+        first.put("z", b"z")  # saving must merge with the index second saved, not overwrite it
+        third = cache.FileCache(self.directory)
+        self.assertEqual(len(third), 3)
+        self.assertTrue(all(third.get(key) is not None for key in "xyz"))
+
+    def test_hits_do_not_save_the_index(self):
+        file_cache = cache.FileCache(self.directory)
+        file_cache.put("x", b"x")
+        index_file_path = os.path.join(self.directory, "index.json")
+        saved = os.stat(index_file_path).st_ino  # every save replaces the file
+        for _ in range(10):
+            self.assertIsNotNone(file_cache.get("x"))
+        self.assertEqual(os.stat(index_file_path).st_ino, saved)
+        file_cache.flush()
+        self.assertNotEqual(os.stat(index_file_path).st_ino, saved)
+
+    def test_corrupt_file(self):
+        file_cache = cache.FileCache(self.directory)
+        file_path = file_cache.put("x", b"content")
+        with open(file_path, "wb") as f:
+            f.write(b"tampered")
+        self.assertIsNone(cache.FileCache(self.directory).get("x"))
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return predicate()
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def batcher(self, function=None, max_size=100, delay=0.05):
+        def record(keys):
+            self.batches.append(keys)
+            return [key * 2 for key in keys]
+        batcher = cache.MicroBatcher(function or record, max_size, delay)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_coalesces(self):
+        batcher = self.batcher()
+        futures = [batcher.submit(key) for key in range(10)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [key * 2 for key in range(10)])
+        self.assertEqual(self.batches, [list(range(10))])
+
+    def test_max_size(self):
+        batcher = self.batcher(max_size=4)
+        futures = [batcher.submit(key) for key in range(10)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [key * 2 for key in range(10)])
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4, 2])
+
+    def test_shared_future(self):
+        batcher = self.batcher()
+        self.assertIs(batcher.submit("key"), batcher.submit("key"))
+
+    def test_error_reaches_every_waiter(self):
+        def fail(keys):
+            raise ValueError(keys)
+        batcher = self.batcher(fail)
+        errors = []
+
+        def wait(key):
+            try:
+                batcher.submit(key).result(timeout=5)
+            except ValueError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=wait, args=(key, )) for key in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 8)
+
+    def test_close(self):
+        batcher = self.batcher(delay=1)
+        future = batcher.submit(1)
+        batcher.close()  # resolves what was already submitted
+        self.assertEqual(future.result(timeout=5), 2)
+        with self.assertRaises(RuntimeError):
+            batcher.submit(2)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def run_contended(self, function, callers=16):
+        single_flight = cache.SingleFlight()
+        barrier = threading.Barrier(callers)
+        outcomes = []
+
+        def call():
+            barrier.wait()
+            try:
+                outcomes.append(single_flight.do("key", function))
+            except ValueError as e:
+                outcomes.append(e)
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(single_flight), 0)
+        return outcomes
+
+    def test_deduplicates(self):
+        calls = []
+
+        def slow():
+            calls.append(None)
+            time.sleep(0.1)
+            return object()
+        outcomes = self.run_contended(slow)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(outcomes), 16)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+
+    def test_error_reaches_every_waiter(self):
+        error = ValueError("failed")
+
+        def fail():
+            time.sleep(0.1)
+            raise error
+        self.assertEqual(self.run_contended(fail), [error] * 16)
+
+    def test_claim(self):
+        single_flight = cache.SingleFlight()
+        claimed, in_flight = single_flight.claim(["a", "b"])
+        self.assertEqual((set(claimed), in_flight), ({"a", "b"}, {}))
+        claimed_again, in_flight = single_flight.claim(["b", "c"])
+        self.assertEqual((set(claimed_again), set(in_flight)), ({"c"}, {"b"}))
+        single_flight.resolve("b", "B")
+        self.assertEqual(in_flight["b"].result(timeout=5), "B")
+        single_flight.resolve("a")
+        single_flight.resolve("c")
+        self.assertEqual(len(single_flight), 0)
+
+
+class TestReadAhead(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+        self.read_ahead = cache.ReadAhead(self.fetched.append, limit=100, min_window=4, max_window=16)
+        self.addCleanup(self.read_ahead.close)
+
+    def read(self, positions, fetches):
+        for position in positions:
+            self.read_ahead.record(position)
+        self.assertTrue(_wait_until(lambda: len(self.fetched) >= fetches))
+        time.sleep(0.01)  # nothing more should arrive
+        self.assertEqual(len(self.fetched), fetches)
+
+    def test_window_grows_while_sequential(self):
+        self.read(range(10, 21), 3)
+        self.assertEqual(self.fetched, [range(12, 16), range(16, 24), range(24, 40)])
+        self.assertEqual(self.read_ahead.window, 16)
+        self.read(range(21, 60), 5)
+        self.assertEqual(self.read_ahead.window, 16)  # capped at max_window
+        self.assertEqual(self.fetched[3:], [range(40, 56), range(56, 72)])
+
+    def test_jump_resets(self):
+        self.read(range(10, 21), 3)
+        self.read([70], 3)
+        self.assertEqual(self.read_ahead.window, 4)
+        self.read([69], 4)  # reading backwards
+        self.assertEqual(self.fetched[3], range(68, 64, -1))
+
+    def test_stops_at_the_limit(self):
+        self.read(range(94, 100), 1)
+        self.assertEqual(self.fetched, [range(96, 100)])  # clipped, and nothing is fetched once the frontier reaches the limit
+
+
+if __name__ == "__main__":
+    unittest.main()
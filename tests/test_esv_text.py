@@ -0,0 +1,84 @@
+import glob
+import json
+import os
+import random
+import re
+import unittest
+import urllib.parse
+
+import bible
+from bible.translations.esv import api as esv_api
+from benchmarks import replay
+
+
+_GENERATED_INPUTS = 50000
+_PIECES = ("[1]", "[16]", "[123]", " ", "\n", "\n\n", "Footnotes", "(1) 3:16 ", "(2) 1:1 ", "Or born again", "The Title", "a", "[", "]", "(", ")",
+           "Footnotes\n\n(1) 2:4 Hebrew yom", "In the beginning, God created the heavens and the earth.")
+
+
+class ReferenceESVText:  # the regex parser that ESVText replaced, kept verbatim as the specification
+    _TEXT_REGEX = re.compile(r"^(?P<title>.+?)?(?P<body>\[\d+\].+?)(?:Footnotes(?P<footnotes>.+))?$")
+    _FOOTNOTES_REGEX = re.compile(r"\((\d+)\) \d+:\d+ (.+?)(?=\(\d+\) |$)")
+
+    def __init__(self, raw_text, chapter=None):
+        self._raw_text = raw_text
+        match = self._TEXT_REGEX.match(raw_text.replace("\n", ""))
+        if match is None:
+            raise esv_api.ESVError("the raw_text from the response did not match the expected pattern")
+        groups = match.groupdict()
+        self._title = groups["title"]
+        self._body = (f"{{{chapter}}}" if chapter else '') + groups["body"]
+        footnotes = groups["footnotes"]
+        self._footnotes = dict(self._FOOTNOTES_REGEX.findall(footnotes)) if footnotes is not None else {}
+
+    def __len__(self):
+        return len(self._body.split())
+
+    @property
+    def body(self):
+        return self._body
+
+    @property
+    def footnotes(self):
+        return self._footnotes
+
+    @property
+    def title(self):
+        return self._title
+
+
+def _parse(cls, raw_text, chapter):
+    try:
+        text = cls(raw_text, chapter)
+    except esv_api.ESVError:
+        return None
+    return text.title, text.body, text.footnotes, len(text)
+
+
+def _recorded_passages():  # any responses recorded from the ESV API with python -m benchmarks --record
+    for file_path in glob.glob(os.path.join(replay.RECORDINGS_DIRECTORY, "*.json")):
+        with open(file_path) as f:
+            recording = json.load(f)
+        if urllib.parse.urlsplit(recording["path"]).path.rstrip("/").endswith("text") and recording["status"] == 200:
+            yield from json.loads(bytes.fromhex(recording["body"]))["passages"]
+
+
+class TestESVText(unittest.TestCase):
+    def assert_equivalent(self, raw_texts):
+        for raw_text in raw_texts:
+            for chapter in (None, 3):
+                self.assertEqual(_parse(ReferenceESVText, raw_text, chapter), _parse(esv_api.ESVText, raw_text, chapter), msg=repr(raw_text))
+
+    def test_corpus(self):  # every verse of the translation as the (replayed) API serves it
+        esv = bible.esv()
+        references = ",".join(verse.int_reference for book in esv.books() for verse in book.verses())
+        _, _, body = replay.synthesize(f"/text/?{urllib.parse.urlencode({'q': references})}")
+        self.assert_equivalent([*json.loads(body)["passages"], *_recorded_passages()])
+
+    def test_generated(self):
+        generator = random.Random(0)
+        self.assert_equivalent("".join(generator.choices(_PIECES, k=generator.randint(1, 12))) for _ in range(_GENERATED_INPUTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
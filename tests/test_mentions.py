@@ -0,0 +1,44 @@
+import unittest
+
+import bible
+
+
+_TEXTS = {  # ESV
+    "Genesis 2:15": "[15] The LORD God took the man and put him in the garden of Eden to work it and keep it.",
+    "Genesis 10:6": "[6] The sons of Ham: Cush, Egypt, Put, and Canaan.",
+    "Genesis 13:1": "[1] So Abram went up from Egypt, he and his wife and all that he had, and Lot with him, into the Negeb.",
+    "Genesis 19:5": "[5] And they called to Lot, “Where are the men who came to you tonight? Bring them out to us, that we may know them.”",
+    "Genesis 24:2": ("[2] And Abraham said to his servant, the oldest of his household, who had charge of all that he had, "
+                     "“Put your hand under my thigh,"),
+    "Exodus 1:1": "[1] These are the names of the sons of Israel who came to Egypt with Jacob, each with his household:",
+    "Leviticus 16:8": "[8] And Aaron shall cast lots over the two goats, one lot for the LORD and the other lot for Azazel."
+}
+
+
+class TestMentions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.esv = bible.esv()
+        cls.verses = {reference: cls.esv.passage(reference).verse_start for reference in _TEXTS}
+
+    def assert_mentions(self, workers):
+        self.esv.index_mentions({self.verses[reference].ordinal: text for reference, text in _TEXTS.items()}, workers=workers)
+        mentions = {reference: {character.name for character in verse.mentions()} for reference, verse in self.verses.items()}
+        self.assertEqual(mentions["Genesis 10:6"], {"Ham", "Cush", "Egypt", "Put", "Canaan"})
+        self.assertNotIn("Put", mentions["Genesis 2:15"])
+        self.assertNotIn("Put", mentions["Genesis 24:2"])  # the verb, even at the start of a sentence
+        self.assertNotIn("Egypt", mentions["Exodus 1:1"])  # the country
+        self.assertNotIn("Egypt", mentions["Genesis 13:1"])
+        self.assertIn("Lot", mentions["Genesis 13:1"])
+        self.assertIn("Lot", mentions["Genesis 19:5"])
+        self.assertEqual(mentions["Leviticus 16:8"], set())
+
+    def test_in_process(self):
+        self.assert_mentions(workers=1)
+
+    def test_process_pool(self):
+        self.assert_mentions(workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import http
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import urllib.error
+import urllib.request
+
+import bible
+from bible import corpus, registry, serve
+from benchmarks import replay
+
+
+def _unreachable_url():  # a port that was free a moment ago, so connections to it are refused
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+
+class TestFallback(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        registry.unload("esv")
+        cls.esv = bible.esv()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.corpus_file_path = os.path.join(cls.directory.name, "fallback.corpus")
+        corpus.write(cls.corpus_file_path, ((None, f"[{verse.number}] Fallback text.", None) for verse in cls.esv._verses))
+        cls.replay = replay.serve()
+        cls.replay_url = cls.replay.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.replay.__exit__(None, None, None)
+        cls.directory.cleanup()
+        registry.unload("esv")
+
+    def setUp(self):
+        self.esv.text_cache.clear()
+        self.fallback_corpus = corpus.Corpus(self.corpus_file_path)
+        self.service = serve.Service(self.esv, self.fallback_corpus)
+        environment = unittest.mock.patch.dict(os.environ, {"ESV_API_URL": _unreachable_url(), "ESV_API_TOKEN": "x"})
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.addCleanup(self.fallback_corpus.close)
+
+    def test_fallback_is_not_cached(self):
+        status, etag, body, cacheable = self.service.respond("/passages", {"q": ["John 3:16"]})
+        self.assertEqual(status, http.HTTPStatus.OK)
+        self.assertIsNone(etag)
+        self.assertFalse(cacheable)
+        self.assertEqual(json.loads(body)["source"], "fallback")
+        os.environ["ESV_API_URL"] = self.replay_url  # the ESV API is back
+        status, etag, body, cacheable = self.service.respond("/passages", {"q": ["John 3:16"]})
+        self.assertIsNotNone(etag)
+        self.assertTrue(cacheable)
+        self.assertEqual(json.loads(body)["source"], "esv")
+
+    def test_fallback_headers(self):
+        server = serve.Server(self.service, port=0, workers=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urllib.request.urlopen(f"{server.url}passages?q=John+3:16") as response:
+            self.assertEqual(response.headers["Cache-Control"], "no-store")
+            self.assertIsNone(response.headers["ETag"])
+        os.environ["ESV_API_URL"] = self.replay_url
+        with urllib.request.urlopen(f"{server.url}passages?q=John+3:16") as response:
+            self.assertEqual(response.headers["Cache-Control"], "public, max-age=86400")
+            etag = response.headers["ETag"]
+        request = urllib.request.Request(f"{server.url}passages?q=John+3:16", headers={"If-None-Match": etag})
+        with self.assertRaises(urllib.error.HTTPError) as context:  # urllib raises for 304
+            urllib.request.urlopen(request)
+        self.assertEqual(context.exception.code, http.HTTPStatus.NOT_MODIFIED)
+
+    def test_unavailable_without_fallback(self):
+        status, etag, body, cacheable = serve.Service(self.esv).respond("/passages", {"q": ["John 3:16"]})
+        self.assertEqual(status, http.HTTPStatus.BAD_GATEWAY)
+        self.assertIsNone(etag)
+        self.assertFalse(cacheable)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import concurrent.futures
+import os
+import unittest
+import unittest.mock
+
+import bible
+from bible import registry
+from benchmarks import replay
+
+
+class TestTextCacheStatistics(unittest.TestCase):  # only the lookups of callers count, not those of prefetching or batching
+    @classmethod
+    def setUpClass(cls):
+        cls.replay = replay.serve()
+        environment = unittest.mock.patch.dict(os.environ, {"ESV_API_URL": cls.replay.__enter__(), "ESV_API_TOKEN": "x"})
+        environment.start()
+        cls.addClassCleanup(environment.stop)
+        cls.addClassCleanup(cls.replay.__exit__, None, None, None)
+        registry.unload("esv")
+        cls.esv = bible.esv()
+        cls.addClassCleanup(registry.unload, "esv")
+        cls.verses = list(cls.esv["Genesis"].verses())
+
+    def setUp(self):
+        self.esv.text_cache.clear()
+        self.esv.configure_text_cache()  # with fresh statistics
+        self.addCleanup(self.esv.micro_batch, False)
+        self.addCleanup(self.esv.read_ahead, False)
+
+    def test_micro_batched(self):
+        self.esv.micro_batch()
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:
+            list(executor.map(lambda verse: verse.text(), self.verses[:100]))
+        statistics = self.esv.text_cache.statistics()
+        self.assertEqual((statistics.hits, statistics.misses), (0, 100))
+
+    def test_read_ahead(self):
+        self.esv.read_ahead()
+        for verse in self.verses[:200]:
+            verse.text()
+        statistics = self.esv.text_cache.statistics()
+        self.assertEqual(statistics.hits + statistics.misses, 200)
+        self.assertGreater(statistics.hit_rate, 0.9)
+
+    def test_texts(self):
+        self.esv.texts(self.verses[:10])
+        self.esv.texts(self.verses[:20])
+        statistics = self.esv.text_cache.statistics()
+        self.assertEqual((statistics.hits, statistics.misses), (10, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()